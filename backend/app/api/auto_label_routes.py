@@ -1,7 +1,8 @@
 # backend/app/api/auto_label_routes.py
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
-from app.services.auto_label import run_auto_label_all, LOW_CONF_FILE, FINAL_IMG_DIR
+from app.services.auto_label import run_auto_label_all, FINAL_IMG_DIR
+from app.services import low_conf_store
 import os
 
 router = APIRouter()
@@ -15,18 +16,24 @@ def run_auto_label():
     return JSONResponse({"status": "completed", "results": results})
 
 @router.get("/auto_label/low_conf")
-def get_low_conf_list():
+def get_low_conf_list(
+    status: str = Query("unresolved", pattern="^(unresolved|resolved|all)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+):
     """
-    Returns list of low confidence images and reasons.
+    Returns one page of low confidence images and reasons.
     Images will be in data/user_object/images/ (moved there by auto label).
     """
-    if os.path.exists(LOW_CONF_FILE):
-        import json
-        with open(LOW_CONF_FILE, "r") as f:
-            data = json.load(f)
-    else:
-        data = []
+    total, data = low_conf_store.query(None if status == "all" else status, offset, limit)
     # attach file path for frontend
     for d in data:
         d["image_url"] = os.path.join("/", FINAL_IMG_DIR.replace("\\","/"), d["image"])
-    return JSONResponse({"low_conf": data})
+    return JSONResponse({"low_conf": data, "total": total, "offset": offset, "limit": limit,
+                         "counts": low_conf_store.counts()})
+
+@router.post("/auto_label/low_conf/{image}/resolve")
+def resolve_low_conf(image: str):
+    if not low_conf_store.resolve(image):
+        raise HTTPException(status_code=404, detail="Image not in low-confidence queue")
+    return {"status": "resolved", "image": image}
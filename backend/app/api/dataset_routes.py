@@ -0,0 +1,29 @@
+# backend/app/api/dataset_routes.py
+from fastapi import APIRouter, Query
+from fastapi.concurrency import run_in_threadpool
+from app.services.dataset_index import dataset_index
+
+router = APIRouter()
+
+@router.post("/dataset/refresh")
+async def refresh_dataset():
+    """Re-read only the images/labels that changed since the last refresh."""
+    changed = await run_in_threadpool(dataset_index.refresh)
+    return {"status": "refreshed", "changed": changed}
+
+@router.get("/dataset/validate")
+async def validate_dataset(refresh: bool = True, limit: int = Query(100, ge=0, le=10000)):
+    """
+    Missing/extra/malformed labels and out-of-range boxes.
+    refresh=false answers straight from the index.
+    """
+    if refresh:
+        await run_in_threadpool(dataset_index.refresh)
+    return await run_in_threadpool(dataset_index.validate, limit)
+
+@router.get("/dataset/stats")
+async def dataset_stats(refresh: bool = True):
+    """Image/label/box counts, median box area and per-class box counts."""
+    if refresh:
+        await run_in_threadpool(dataset_index.refresh)
+    return await run_in_threadpool(dataset_index.stats)
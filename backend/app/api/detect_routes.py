@@ -1,27 +1,60 @@
 # backend/app/api/detect_routes.py
 
-from fastapi import APIRouter, UploadFile, File, Query
+from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 import os
-from app.services.detect import detect_object, detect_from_stream
+import asyncio
+from app.services.detect import detect_object, detect_batch, registry
+from app.services import inference_pool, blob_store
+from app.services.batcher import MicroBatcher, BATCH_MAX_SIZE
 
 router = APIRouter()
 
+# Opt-in: keep a copy of every uploaded detection input (for auditing)
+AUDIT_INPUTS = os.environ.get("DETECT_AUDIT_INPUTS", "0") == "1"
+AUDIT_DIR = "data/detect_input/"
+
+# Concurrent uploads are coalesced into one batched forward pass per model
+detect_batcher = MicroBatcher(detect_batch) if BATCH_MAX_SIZE > 1 else None
+
+
+def _save_audit_copy(data, filename):
+    """
+    Keep the input via the blob store: identical inputs are stored once, and a
+    name collision with different content gets a hash suffix (no overwrites).
+    """
+    safe_name = os.path.basename(filename or "upload.jpg")
+    digest = blob_store.ingest_bytes(data, os.path.splitext(safe_name)[1])
+    final, _ = blob_store.place(digest, AUDIT_DIR, safe_name)
+    return os.path.join(AUDIT_DIR, final)
+
+
 # ============================================================
 # 1) Detect object from uploaded image
 # ============================================================
 @router.post("/detect/image")
 async def detect_image(file: UploadFile = File(...)):
-    folder = "data/detect_input/"
-    os.makedirs(folder, exist_ok=True)
+    # The encoded bytes go to the worker pool, which decodes them in memory:
+    # no decode on the event loop, and a process pool pickles the small
+    # compressed payload instead of the full pixel array
+    data = await file.read()
 
-    file_path = os.path.join(folder, file.filename)
+    if AUDIT_INPUTS:
+        await run_in_threadpool(_save_audit_copy, data, file.filename)
 
-    # Save uploaded file
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
-
-    # Run YOLO detection
-    result = detect_object(file_path)
+    # Run YOLO detection on the worker pool (keeps the event loop free);
+    # undecodable input comes back as {"detected": False, "error": "cannot_read_image"}
+    try:
+        if detect_batcher:
+            result = await inference_pool.run_batched(detect_batcher, data)
+        else:
+            result = await inference_pool.run(detect_object, data)
+    except inference_pool.PoolFull:
+        raise HTTPException(status_code=503, detail="Detection queue full, retry later",
+                            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Detection timed out")
 
     return {
         "status": "ok",
@@ -30,20 +63,22 @@ async def detect_image(file: UploadFile = File(...)):
     }
 
 
-# ============================================================
-# 2) Detect object from IP Webcam (single frame)
-# Used by LiveDetection.tsx
-# ============================================================
-@router.get("/detect/stream")
-def detect_stream(url: str = Query(..., description="IP webcam MJPEG URL")):
+@router.get("/detect/pool")
+def detect_pool_stats():
+    """Worker pool size, queue capacity, counters and batching stats."""
+    stats = inference_pool.stats()
+    stats["batching"] = detect_batcher.stats() if detect_batcher else None
+    return stats
+
+
+@router.get("/detect/ready")
+def detect_ready():
     """
-    Example:
-    /detect/stream?url=http://192.168.x.x:8080/video
+    Readiness probe: 503 while a model is loading, the startup warm-up
+    (MODEL_WARMUP=1) is running, or a required model (the default COCO one)
+    failed / is missing, else 200. Lazily unloaded models count as ready,
+    so label-only workers and MODEL_WARMUP=0 pods still get traffic.
     """
-    result = detect_from_stream(url)
-
-    return {
-        "status": "ok",
-        "stream": url,
-        "result": result
-    }
+    ready = registry.ready()
+    return JSONResponse({"ready": ready, "models": registry.status()},
+                        status_code=200 if ready else 503)
@@ -1,23 +1,34 @@
-from fastapi import APIRouter
-import os
+from typing import Optional
+from fastapi import APIRouter, Request, Response
+from fastapi.responses import JSONResponse
+from app.services.label_index import label_index
 
 router = APIRouter()
 
-TRAIN_LABELS = "data/train_tmp/labels"
-MANUAL_LABELS = "data/user_object/labels"
-
 @router.get("/labels/status")
-def label_status():
-    """Return dictionary marking which images already have labels."""
-    result = {}
-
-    # All label files in both folders
-    train_lbls = {f.rsplit(".", 1)[0] for f in os.listdir(TRAIN_LABELS) if f.endswith(".txt")}
-    manual_lbls = {f.rsplit(".", 1)[0] for f in os.listdir(MANUAL_LABELS) if f.endswith(".txt")}
+def label_status(request: Request, since: Optional[int] = None):
+    """
+    Return dictionary marking which images already have labels.
 
-    combined = train_lbls | manual_lbls
+    Served from the in-memory label index (no directory scan per request).
+    - If-None-Match with the last ETag → 304 when nothing changed
+    - ?since=N → only {"version", "added", "removed"} after version N;
+      "full": true with the whole map when N is too old for the changelog
+    """
+    etag = label_index.etag
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
 
-    for name in combined:
-        result[name] = True  # label exists
+    if since is not None:
+        delta = label_index.changes_since(since)
+        if delta is not None:
+            version, added, removed = delta
+            return JSONResponse({"version": version, "full": False,
+                                 "added": added, "removed": removed},
+                                headers={"ETag": etag, "X-Label-Version": str(version)})
+        version, etag, labels = label_index.snapshot()
+        return JSONResponse({"version": version, "full": True, "labels": labels},
+                            headers={"ETag": etag, "X-Label-Version": str(version)})
 
-    return result
+    version, etag, labels = label_index.snapshot()
+    return JSONResponse(labels, headers={"ETag": etag, "X-Label-Version": str(version)})
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
+from typing import List
+from app.services import low_conf_store
+from app.utils.label_io import write_label, NUM_CLASSES
 import os
 
 FINAL_IMG_DIR = "data/user_object/images/"
 FINAL_LABEL_DIR = "data/user_object/labels/"
 
+MAX_BATCH_IMAGES = int(os.environ.get("MANUAL_LABEL_MAX_BATCH", 1000))
+
 class ManualLabel(BaseModel):
     image: str
     x1: int
@@ -14,8 +19,42 @@ class ManualLabel(BaseModel):
     img_w: int
     img_h: int
 
+class Box(BaseModel):
+    x1: int
+    y1: int
+    x2: int
+    y2: int
+    class_id: int = 0
+
+class ImageLabels(BaseModel):
+    image: str
+    img_w: int
+    img_h: int
+    boxes: List[Box]  # empty list = background image (empty label file)
+
+class ManualLabelBatch(BaseModel):
+    items: List[ImageLabels]
+
 router = APIRouter()
 
+def _yolo_line(class_id, x1, y1, x2, y2, img_w, img_h):
+    """Corner points (px, any order) → "cls xc yc w h" (YOLO normalized)."""
+    x = min(x1, x2)
+    y = min(y1, y2)
+    w = abs(x2 - x1)
+    h = abs(y2 - y1)
+
+    xc = (x + w/2) / img_w
+    yc = (y + h/2) / img_h
+    nw = w / img_w
+    nh = h / img_h
+
+    return f"{class_id} {xc:.6f} {yc:.6f} {nw:.6f} {nh:.6f}"
+
+def _label_path(image):
+    name = os.path.splitext(image)[0]   # same stem rule as dataset_index / ultralytics
+    return name + ".txt", os.path.join(FINAL_LABEL_DIR, name + ".txt")
+
 @router.post("/label/manual")
 def manual_label(data: ManualLabel):
 
@@ -24,22 +63,69 @@ def manual_label(data: ManualLabel):
         raise HTTPException(status_code=404, detail="Image not found")
 
     # Normalize to YOLO format
-    x = min(data.x1, data.x2)
-    y = min(data.y1, data.y2)
-    w = abs(data.x2 - data.x1)
-    h = abs(data.y2 - data.y1)
+    label_line = _yolo_line(0, data.x1, data.y1, data.x2, data.y2, data.img_w, data.img_h)
+
+    label_file, label_path = _label_path(data.image)
+
+    write_label(label_path, label_line)
+
+    # a hand-drawn box settles any pending low-confidence review
+    low_conf_store.resolve(data.image)
+
+    return {"status": "saved", "label_file": label_file}
+
+def _validate_item(item):
+    """All problems with one image entry (empty list = ok)."""
+    errors = []
+    if os.path.basename(item.image) != item.image or not item.image:
+        return ["invalid image name"]
+    if not os.path.exists(os.path.join(FINAL_IMG_DIR, item.image)):
+        return ["image not found"]
+    if item.img_w <= 0 or item.img_h <= 0:
+        return ["img_w and img_h must be positive"]
+    for j, b in enumerate(item.boxes):
+        if not 0 <= b.class_id < NUM_CLASSES:
+            errors.append(f"box {j}: class_id must be in 0..{NUM_CLASSES - 1}")
+        xs, ys = sorted((b.x1, b.x2)), sorted((b.y1, b.y2))
+        if xs[0] < 0 or ys[0] < 0 or xs[1] > item.img_w or ys[1] > item.img_h:
+            errors.append(f"box {j}: outside the image")
+        elif xs[0] == xs[1] or ys[0] == ys[1]:
+            errors.append(f"box {j}: zero area")
+    return errors
 
-    xc = (x + w/2) / data.img_w
-    yc = (y + h/2) / data.img_h
-    nw = w / data.img_w
-    nh = h / data.img_h
+@router.post("/label/manual/batch")
+def manual_label_batch(data: ManualLabelBatch):
+    """
+    Label many images in one request; each image may have several boxes
+    with their own class ids. The whole batch is validated first and nothing
+    is written unless every entry is valid (422 lists all problems).
+    Each label file replaces the previous one atomically; the images leave
+    the low-confidence queue and the label index is updated as they land.
+    """
+    if len(data.items) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
 
-    label_line = f"0 {xc:.6f} {yc:.6f} {nw:.6f} {nh:.6f}"
+    errors = []
+    seen = {}   # label file -> first image writing it
+    for i, item in enumerate(data.items):
+        problems = _validate_item(item)
+        label_file, _ = _label_path(item.image)
+        if label_file in seen:
+            problems.append(f"same label file as {seen[label_file]}")
+        seen.setdefault(label_file, item.image)
+        if problems:
+            errors.append({"index": i, "image": item.image, "errors": problems})
+    if errors:
+        raise HTTPException(status_code=422, detail=errors)
 
-    name = data.image.split(".")[0]
-    label_path = os.path.join(FINAL_LABEL_DIR, name + ".txt")
+    saved = []
+    for item in data.items:
+        lines = [_yolo_line(b.class_id, b.x1, b.y1, b.x2, b.y2, item.img_w, item.img_h)
+                 for b in item.boxes]
+        label_file, label_path = _label_path(item.image)
+        write_label(label_path, "\n".join(lines) + ("\n" if lines else ""))
+        saved.append({"image": item.image, "label_file": label_file, "boxes": len(lines)})
 
-    with open(label_path, "w") as f:
-        f.write(label_line)
+    resolved = low_conf_store.resolve_many([item.image for item in data.items])
 
-    return {"status": "saved", "label_file": name + ".txt"}
+    return {"status": "saved", "saved": saved, "resolved": resolved}
@@ -1,13 +1,154 @@
-from fastapi import APIRouter
-from app.services.detect import detect_from_stream
+# backend/app/api/stream_routes.py
+# All stream endpoints live here: single-frame polling, live push (SSE/WS)
+# and the multi-camera hub.
+import json
+import asyncio
+from fastapi import APIRouter, Query, Request, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from app.services import inference_pool
+from app.services.detect import detect_object
+from app.services.live_hub import live_hub
+from app.services.camera_hub import camera_hub
+from app.services.stream_manager import stream_manager
 
 router = APIRouter()
 
+SSE_KEEPALIVE = 15.0   # seconds between keep-alive comments when no result arrives
+
+
+class CameraIn(BaseModel):
+    name: str
+    url: str
+
+
+# ============================================================
+# 1) Detect object from IP Webcam (latest frame of persistent reader)
+# ============================================================
 @router.get("/detect/stream")
-def detect_stream(url: str):
+async def detect_stream(url: str = Query(..., description="IP webcam MJPEG URL")):
     """
     Example:
     /api/detect/stream?url=http://192.168.1.8:8080/video
     """
-    result = detect_from_stream(url)
-    return {"status": "ok", "result": result}
+    # the (possibly waiting) frame grab stays off the loop; inference goes
+    # through the shared pool with the same admission control as /detect/image
+    frame, error = await run_in_threadpool(stream_manager.latest_frame, url)
+    if frame is None:
+        result = {"error": error}
+    else:
+        try:
+            result = await inference_pool.run(detect_object, frame)
+        except inference_pool.PoolFull:
+            raise HTTPException(status_code=503, detail="Detection queue full, retry later",
+                                headers={"Retry-After": "1"})
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Detection timed out")
+    return {
+        "status": "ok",
+        "stream": url,
+        "result": result
+    }
+
+
+@router.get("/detect/streams")
+def detect_streams():
+    """Persistent stream readers currently open (url, health, idle time)."""
+    return {"streams": stream_manager.info()}
+
+
+# ============================================================
+# 2) Server-push live detection (one inference loop, many viewers)
+# ============================================================
+@router.get("/detect/stream/events")
+async def detect_stream_events(request: Request,
+                               url: str = Query(..., description="IP webcam MJPEG URL")):
+    """
+    Server-Sent Events: every detection result of the shared live loop for `url`.
+    Example (browser):
+    new EventSource("/api/detect/stream/events?url=http://192.168.1.8:8080/video")
+    """
+    broadcast = live_hub.get(url)
+    sub = broadcast.subscribe()
+    _, q = sub
+
+    async def event_gen():
+        try:
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), SSE_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"id: {event['seq']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcast.unsubscribe(sub)
+
+    return StreamingResponse(event_gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@router.websocket("/detect/stream/ws")
+async def detect_stream_ws(websocket: WebSocket, url: str):
+    """WebSocket variant of /detect/stream/events (same payload, JSON per message)."""
+    await websocket.accept()
+    broadcast = live_hub.get(url)
+    sub = broadcast.subscribe()
+    _, q = sub
+    # watch the socket concurrently so a silent stream still notices disconnects
+    recv = asyncio.create_task(websocket.receive_text())
+    try:
+        while True:
+            get = asyncio.create_task(q.get())
+            done, _ = await asyncio.wait({get, recv}, return_when=asyncio.FIRST_COMPLETED)
+            if recv in done:
+                get.cancel()
+                recv.result()            # raises WebSocketDisconnect on close
+                recv = asyncio.create_task(websocket.receive_text())
+                continue
+            await websocket.send_text(json.dumps(get.result()))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        recv.cancel()
+        broadcast.unsubscribe(sub)
+
+
+@router.get("/detect/stream/live")
+def detect_stream_live_info():
+    """Running live broadcasts, viewer counts and per-stage latency stats."""
+    return {"broadcasts": live_hub.info()}
+
+
+# ============================================================
+# 3) Multi-camera hub (named cameras, shared round-robin inference)
+# ============================================================
+@router.post("/streams/cameras")
+def add_camera(cam: CameraIn):
+    """Register (or re-point) a named camera; detection starts immediately."""
+    if not cam.name.strip() or not cam.url.strip():
+        raise HTTPException(status_code=400, detail="name and url are required")
+    camera_hub.register(cam.name.strip(), cam.url.strip())
+    return {"status": "registered", "name": cam.name.strip()}
+
+
+@router.delete("/streams/cameras/{name}")
+def remove_camera(name: str):
+    if not camera_hub.unregister(name):
+        raise HTTPException(status_code=404, detail="Camera not found")
+    return {"status": "removed", "name": name}
+
+
+@router.get("/streams/cameras")
+def list_cameras():
+    """Every camera with its latest result and health."""
+    return {"cameras": camera_hub.list()}
+
+
+@router.get("/streams/cameras/{name}")
+def camera_result(name: str):
+    cam = camera_hub.get(name)
+    if cam is None:
+        raise HTTPException(status_code=404, detail="Camera not found")
+    return cam
@@ -4,17 +4,21 @@ import os
 import shutil
 import threading
 import time
-import json
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
+from fastapi import APIRouter, Request, HTTPException
 from pathlib import Path
+import uuid
+import queue
 import subprocess
 import traceback
-import cv2
 
-# per-image contour labeler (returns ok,label_or_reason,bbox)
-from app.services.auto_label import contour_auto_label
-from app.services.detect import reload_model
+# contour labeler over a process pool (yields ok,label_or_reason,bbox,dims per image)
+from app.services.auto_label import contour_auto_label_many
+from app.services.detect import reload_model, registry
+from app.services import model_versions, model_backends
+from app.services.status_store import StatusStore
+from app.services import blob_store
+from app.utils.multipart_stream import iter_multipart
+from app.utils.label_io import write_label, copy_label, clear_labels, NUM_CLASSES
 
 router = APIRouter()
 
@@ -25,18 +29,20 @@ IMAGES_TMP = os.path.join(TRAIN_TMP, "images")
 LABELS_TMP = os.path.join(TRAIN_TMP, "labels")
 DATA_YAML = os.path.join(TRAIN_TMP, "data.yaml")
 STATUS_FILE = os.path.join(TRAIN_TMP, "train_status.json")
+USER_IMG_DIR = os.path.join("data", "user_object", "images")
 
 os.makedirs(IMAGES_TMP, exist_ok=True)
 os.makedirs(LABELS_TMP, exist_ok=True)
 
 # ---------------- GLOBAL STATE ----------------
 
-training_state = {
+# In memory; snapshots go to STATUS_FILE at most every STATUS_SAVE_INTERVAL_MS
+training_state = StatusStore(STATUS_FILE, {
     # Training
     "running": False,
     "progress": 0,            # 0-100
     "status": "idle",
-    "log": [],
+    "log": [],                # ring buffer (last STATUS_LOG_MAX lines)
     "last_run": None,
     "error": None,
 
@@ -47,17 +53,11 @@ training_state = {
     "upload_current": None,
     "upload_errors": [],
     "upload_percent": 0
-}
+})
 
-def save_status():
-    # ensure folder exists
-    os.makedirs(os.path.dirname(STATUS_FILE), exist_ok=True)
-    try:
-        with open(STATUS_FILE, "w", encoding="utf-8") as f:
-            json.dump(training_state, f, indent=2)
-    except Exception:
-        print("WARN: failed to write status file:", STATUS_FILE)
-        traceback.print_exc()
+def save_status(force=False):
+    """Debounced, atomic snapshot of training_state (force=True for final states)."""
+    training_state.save(force=force)
 
 
 # ------------------ UTIL: auto-fix bbox ------------------
@@ -112,10 +112,14 @@ def _clamp_and_shrink_bbox(bbox, img_w, img_h):
 # ============================================================
 
 @router.post("/train/upload")
-async def upload_train_images(
-    label: str = File(...),
-    files: List[UploadFile] = File(...)
-):
+async def upload_train_images(request: Request):
+    """
+    multipart/form-data: `files` (many images) + optional `label`.
+    The body is parsed while it streams in: each file is written to disk chunk by
+    chunk, stored once in the blob store (duplicates skipped), linked into
+    train_tmp/images and user_object/images and handed to the auto-label thread
+    immediately, so labeling overlaps the upload and memory stays flat.
+    """
 
     if training_state["running"]:
         raise HTTPException(status_code=409, detail="Training already running")
@@ -123,132 +127,190 @@ async def upload_train_images(
     # Reset upload state
     training_state.update({
         "upload_phase": "uploading",
-        "upload_total": len(files),
+        "upload_total": 0,
         "upload_processed": 0,
         "upload_current": None,
         "upload_errors": [],
         "upload_percent": 0,
         "status": "uploading",
-        "label": label.strip()
+        "label": "object"
     })
     save_status()
 
     # Clear training temp folder
-    for p in [IMAGES_TMP, LABELS_TMP]:
-        shutil.rmtree(p, ignore_errors=True)
-        os.makedirs(p, exist_ok=True)
+    shutil.rmtree(IMAGES_TMP, ignore_errors=True)
+    os.makedirs(IMAGES_TMP, exist_ok=True)
+    blob_store.forget_dir(IMAGES_TMP)
+    threading.Thread(target=blob_store.gc, daemon=True).start()   # free orphaned blobs off the loop
+    clear_labels(LABELS_TMP)
 
     # Ensure manual label folder exists
-    USER_IMG_DIR = "data/user_object/images/"
     os.makedirs(USER_IMG_DIR, exist_ok=True)
 
-    saved_names = []
-
-    for f in files:
-        img_bytes = await f.read()
-
-        # 1️⃣ Save to train_tmp/images
-        train_path = os.path.join(IMAGES_TMP, f.filename)
-        with open(train_path, "wb") as out:
-            out.write(img_bytes)
+    # Landed files are pushed here; None = upload finished
+    incoming = queue.Queue()
 
-        # 2️⃣ Save to user_object/images
-        user_path = os.path.join(USER_IMG_DIR, f.filename)
-        with open(user_path, "wb") as out2:
-            out2.write(img_bytes)
-
-        saved_names.append(f.filename)
-
-    # Start auto-label thread
+    # Start auto-label thread (consumes files while the upload continues)
     def _thread_starter():
         try:
-            _auto_label_thread()
+            _auto_label_thread(iter(incoming.get, None))
         except Exception as e:
             training_state["upload_phase"] = "failed"
             training_state["upload_errors"].append({"error": str(e)})
-            save_status()
+            save_status(force=True)
 
     threading.Thread(target=_thread_starter, daemon=True).start()
 
-    return {"status": "started", "saved": saved_names}
-
-
+    saved_names = []
+    duplicates = []
+    out = None
+    fname = None
+    part_path = None
+    digest = None
 
-def _auto_label_thread():
+    try:
+        async for event in iter_multipart(request):
+            kind = event[0]
+
+            if kind == "field" and event[1] == "label" and event[2].strip():
+                training_state["label"] = event[2].strip()
+
+            elif kind == "file_start":
+                fname = os.path.basename(event[2])
+                if not fname.lower().endswith((".jpg", ".jpeg", ".png")):
+                    training_state["upload_errors"].append({"image": fname, "reason": "unsupported_type"})
+                    fname = None
+                    continue
+                # Stream to a temp part file, hashing as the bytes arrive
+                part_path = os.path.join(IMAGES_TMP, f".{uuid.uuid4().hex}.part")
+                out = open(part_path, "wb")
+                digest = blob_store.hasher()
+
+            elif kind == "file_data" and out is not None:
+                out.write(event[1])
+                digest.update(event[1])
+
+            elif kind == "file_end" and out is not None:
+                out.close()
+                out = None
+
+                # 1️⃣ train_tmp/images: link to the content-addressed blob
+                stored = blob_store.store_file(part_path, IMAGES_TMP, fname, digest.hexdigest())
+                if stored["status"] == "duplicate":
+                    duplicates.append({"file": fname, "existing": stored["name"]})
+                    continue
+
+                # 2️⃣ user_object/images: another link to the same blob, not a second copy
+                blob_store.place(stored["hash"], USER_IMG_DIR, stored["name"])
+
+                saved_names.append(stored["name"])
+                training_state["upload_total"] += 1
+                incoming.put(stored["name"])
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        if out is not None:
+            out.close()
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        incoming.put(None)
+
+    return {"status": "started", "saved": saved_names, "duplicates_skipped": duplicates}
+
+
+def _auto_label_thread(incoming=None):
     """
-    Runs in background: iterates images in IMAGES_TMP, runs contour_auto_label on each,
+    Runs in background: labels images in IMAGES_TMP with contour_auto_label,
     writes YOLO txt labels to LABELS_TMP, updates training_state.upload_* fields and percent.
+    `incoming` yields file names as an upload lands them; None = label what is on disk.
     Auto-fixes bad bboxes so YOLO has labels for all images.
     """
     print("DEBUG: _auto_label_thread invoked")
     training_state["upload_phase"] = "auto-labeling"
     save_status()
 
-    try:
-        imgs = [f for f in os.listdir(IMAGES_TMP)
-                if f.lower().endswith((".jpg", ".jpeg", ".png"))]
-    except Exception as e:
-        print("ERROR: cannot list IMAGES_TMP:", IMAGES_TMP, repr(e))
-        traceback.print_exc()
-        training_state["upload_phase"] = "failed"
-        training_state["upload_errors"].append({"error": str(e)})
-        save_status()
-        return
+    if incoming is None:
+        try:
+            incoming = [f for f in os.listdir(IMAGES_TMP)
+                        if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+        except Exception as e:
+            print("ERROR: cannot list IMAGES_TMP:", IMAGES_TMP, repr(e))
+            traceback.print_exc()
+            training_state["upload_phase"] = "failed"
+            training_state["upload_errors"].append({"error": str(e)})
+            save_status(force=True)
+            return
+
+        print("DEBUG: files in IMAGES_TMP:", incoming)
+        training_state["upload_total"] = len(incoming)
+        training_state["upload_errors"] = []
 
-    print("DEBUG: files in IMAGES_TMP:", imgs)
-    total = len(imgs)
-    training_state["upload_total"] = total
     training_state["upload_processed"] = 0
-    training_state["upload_errors"] = []
     training_state["upload_percent"] = 0
     save_status()
 
-    for idx, fname in enumerate(imgs):
-        try:
-            training_state["upload_current"] = fname
-            save_status()
+    def _advance():
+        # increment processed count and compute percent defensively
+        training_state["upload_processed"] += 1
+        total_safe = max(1, training_state.get("upload_total", 0))
+        training_state["upload_percent"] = int((training_state["upload_processed"] / total_safe) * 100)
+        save_status()
 
-            img_path = os.path.join(IMAGES_TMP, fname)
+    def _needs_auto_label(names):
+        """
+        1️⃣ If manual label exists → use it directly and skip auto-label.
+        Yields image paths that still need the contour labeler.
+        """
+        for fname in names:
             label_path = os.path.join(LABELS_TMP, fname.rsplit(".", 1)[0] + ".txt")
-            
-            # 1️⃣ If manual label exists → use it directly and skip auto-label
             manual_label_path = os.path.join(
                 "data/user_object/labels",
                 fname.rsplit(".", 1)[0] + ".txt"
             )
 
-            if os.path.exists(manual_label_path):
-                shutil.copyfile(manual_label_path, label_path)
+            if not os.path.exists(manual_label_path):
+                yield os.path.join(IMAGES_TMP, fname)
+                continue
+
+            try:
+                copy_label(manual_label_path, label_path)
                 print(f"DEBUG: Using manual label for {fname}")
                 training_state["upload_errors"].append({
                     "image": fname,
                     "reason": "manual_label_used"
                 })
-                training_state["upload_processed"] += 1
-                training_state["upload_percent"] = int((training_state["upload_processed"] / max(1, total)) * 100)
-                save_status()
-                continue
-
+            except Exception as e:
+                print("ERROR: copying manual label for", fname, repr(e))
+                training_state["upload_errors"].append({"image": fname, "error": str(e)})
+            _advance()
+
+    # 2️⃣ Contour auto-label across a process pool; results arrive in input order
+    start_t = time.time()
+    labeled = 0
+    cache_stats = {}
+
+    for img_path, res in contour_auto_label_many(_needs_auto_label(incoming), stats=cache_stats):
+        fname = os.path.basename(img_path)
+        labeled += 1
+        try:
+            training_state["upload_current"] = fname
+            label_path = os.path.join(LABELS_TMP, fname.rsplit(".", 1)[0] + ".txt")
 
-            print(f"DEBUG: processing image: {img_path}")
-            start_t = time.time()
-            ok, info, bbox = contour_auto_label(img_path)
-            duration = time.time() - start_t
-            print(f"DEBUG: processed {fname} - ok={ok} info={info} time={duration:.3f}s")
+            # dims come back with the result → no second decode
+            ok, info, bbox, dims = res
+            print(f"DEBUG: processed {fname} - ok={ok} info={info}")
 
-            # Read image dims (for auto-fix)
-            img = cv2.imread(img_path)
-            if img is None:
+            if dims is None:
                 # cannot read - record error and skip
                 training_state["upload_errors"].append({"image": fname, "reason": "cannot_read_image"})
             else:
-                h, w = img.shape[:2]
+                w, h = dims
 
                 if ok:
                     # info contains YOLO label line already
                     try:
-                        with open(label_path, "w", encoding="utf-8") as f:
-                            f.write(info + "\n")
+                        write_label(label_path, info + "\n")
                     except Exception as e:
                         print(f"ERROR: writing label for {fname}: {e}")
                         training_state["upload_errors"].append({"image": fname, "error": str(e)})
@@ -256,8 +318,7 @@ def _auto_label_thread():
                     # Auto-fix: use returned bbox if present, else fallback central box
                     try:
                         fixed_label = _clamp_and_shrink_bbox(bbox, w, h)
-                        with open(label_path, "w", encoding="utf-8") as f:
-                            f.write(fixed_label + "\n")
+                        write_label(label_path, fixed_label + "\n")
                         # Record that we auto-fixed this image (helpful for UI)
                         training_state["upload_errors"].append({
                             "image": fname,
@@ -269,33 +330,29 @@ def _auto_label_thread():
                         traceback.print_exc()
                         training_state["upload_errors"].append({"image": fname, "error": str(e)})
 
-            # increment processed count and compute percent defensively
-            training_state["upload_processed"] += 1
-            total_safe = max(1, training_state.get("upload_total", total))
-            training_state["upload_percent"] = int((training_state["upload_processed"] / total_safe) * 100)
-            save_status()
-
         except Exception as e:
             print("ERROR: exception while processing", fname, repr(e))
             traceback.print_exc()
             training_state["upload_errors"].append({"image": fname, "error": str(e)})
-            training_state["upload_processed"] += 1
-            total_safe = max(1, training_state.get("upload_total", total))
-            training_state["upload_percent"] = int((training_state["upload_processed"] / total_safe) * 100)
-            save_status()
-            continue
+
+        _advance()
+
+    print(f"DEBUG: auto-labeled {labeled} images in {time.time() - start_t:.3f}s "
+          f"(cached={cache_stats.get('cached', 0)} computed={cache_stats.get('computed', 0)})")
 
     # Write proper data.yaml (ultralytics expects valid YAML)
     try:
         train_path = os.path.abspath(IMAGES_TMP).replace("\\", "/")
         user_label = training_state.get("label", "object")
+        # class 0 is the user's object; extra classes (LABEL_NUM_CLASSES) get placeholder names
+        names = [user_label] + [f"class_{i}" for i in range(1, NUM_CLASSES)]
 
         yaml_lines = [
             f"train: {train_path}",
             f"val: {train_path}",
             "",
-            f"nc: 1",
-            f'names: ["{user_label}"]'
+            f"nc: {NUM_CLASSES}",
+            "names: [" + ", ".join(f'"{n}"' for n in names) + "]"
         ]
 
         with open(DATA_YAML, "w", encoding="utf-8") as f:
@@ -311,8 +368,8 @@ def _auto_label_thread():
     training_state["status"] = "uploaded"
     training_state["upload_current"] = None
     training_state["upload_percent"] = 100
-    save_status()
-    print("DEBUG: auto-label thread finished, total:", total)
+    save_status(force=True)
+    print("DEBUG: auto-label thread finished, total:", training_state["upload_total"])
 
 
 @router.get("/train/upload-status")
@@ -404,7 +461,7 @@ def _train_thread(data_yaml_path, epochs=20, batch=8, imgsz=640):
                 "error": f"Training failed: rc={proc.returncode}",
                 "running": False
             })
-            save_status()
+            save_status(force=True)
             return
 
         # Copy best.pt (ultralytics writes to runs/train/<name>/weights/best.pt)
@@ -421,7 +478,7 @@ def _train_thread(data_yaml_path, epochs=20, batch=8, imgsz=640):
                 "error": "best.pt not found in train/ or detect/",
                 "running": False
             })
-            save_status()
+            save_status(force=True)
             return
 
         if not best_path.exists():
@@ -430,21 +487,34 @@ def _train_thread(data_yaml_path, epochs=20, batch=8, imgsz=640):
                 "error": "best.pt not found",
                 "running": False
             })
-            save_status()
+            save_status(force=True)
             return
 
-        os.makedirs("app/model", exist_ok=True)
+        # Publish best.pt as a new immutable version (atomic copy), then point at it
         try:
-            shutil.copyfile(best_path, "app/model/best.pt")
+            version = model_versions.publish(best_path, "custom")
+            backend = model_backends.backend_for("custom")
+            if backend != "torch" and model_backends.runtime_available(backend):
+                # export before the swap so the new version comes up on the fast runtime
+                try:
+                    model_backends.export(model_versions.version_path(version), backend)
+                    training_state["log"].append(f"Exported {version} for {backend}")
+                except Exception as e:
+                    training_state["log"].append(f"{backend} export failed, serving torch: {e}")
+            model_versions.set_current(version, "custom")
+            training_state["log"].append(f"Published model version {version}")
         except Exception as e:
-            print("ERROR: copying best.pt:", repr(e))
-            training_state["log"].append(f"Error copying best.pt: {e}")
+            print("ERROR: publishing best.pt:", repr(e))
+            training_state["log"].append(f"Error publishing best.pt: {e}")
             save_status()
 
-        # reload model in memory
+        # hot-swap the model in memory (old version serves until the new one is warm)
         try:
-            reload_model()
-            training_state["log"].append("Model reloaded.")
+            if reload_model():
+                training_state["log"].append("Model reloaded.")
+            else:
+                training_state["log"].append("Reload failed: previous model kept.")
+            model_versions.prune("custom", in_use=registry.versions_in_use())
         except Exception as e:
             print("ERROR: reload_model failed:", repr(e))
             training_state["log"].append(f"Reload failed: {e}")
@@ -455,7 +525,7 @@ def _train_thread(data_yaml_path, epochs=20, batch=8, imgsz=640):
             "running": False,
             "last_run": str(best_path)
         })
-        save_status()
+        save_status(force=True)
 
     except Exception as e:
         print("ERROR: Exception in _train_thread:", repr(e))
@@ -465,7 +535,7 @@ def _train_thread(data_yaml_path, epochs=20, batch=8, imgsz=640):
             "error": str(e),
             "running": False
         })
-        save_status()
+        save_status(force=True)
 
 
 @router.post("/train/start")
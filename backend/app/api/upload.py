@@ -1,7 +1,8 @@
 import os
-import shutil
+import uuid
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from fastapi.responses import JSONResponse
+from app.services import blob_store
 
 router = APIRouter()
 
@@ -16,23 +17,33 @@ async def upload_images(files: list[UploadFile] = File(...)):
     if len(files) == 0:
         raise HTTPException(status_code=400, detail="No files uploaded")
 
-    saved_files = []
-
     for file in files:
         ext = file.filename.split(".")[-1].lower()
         if ext not in allowed_ext:
             raise HTTPException(status_code=400, detail=f"Unsupported file type: {file.filename}")
 
-        save_path = os.path.join(CACHE_DIR, file.filename)
-
-        # Save to cache
-        with open(save_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    saved_files = []
+    duplicates = []
 
-        saved_files.append(file.filename)
+    for file in files:
+        # Stream to a temp file while hashing, then hand it to the blob store
+        tmp_path = os.path.join(CACHE_DIR, f".incoming_{uuid.uuid4().hex}")
+        h = blob_store.hasher()
+        with open(tmp_path, "wb") as buffer:
+            for chunk in iter(lambda: file.file.read(blob_store.CHUNK), b""):
+                h.update(chunk)
+                buffer.write(chunk)
+
+        stored = blob_store.store_file(tmp_path, CACHE_DIR, file.filename, h.hexdigest())
+        if stored["status"] == "duplicate":
+            duplicates.append({"file": file.filename, "existing": stored["name"]})
+        else:
+            saved_files.append(stored["name"])
 
     return JSONResponse({
         "status": "success",
         "files_saved": saved_files,
+        "duplicates_skipped": duplicates,
         "folder": CACHE_DIR
     })
@@ -8,7 +8,15 @@ from app.api.stream_routes import router as stream_router
 from app.api.train_routes import router as train_router
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.label_status import router as label_status_router
+from app.api.dataset_routes import router as dataset_router
+from app.services import inference_pool, blob_store
+from app.services.stream_manager import stream_manager
+from app.services.live_hub import live_hub
+from app.services.camera_hub import camera_hub
+from app.services.reference_area import reference_area
+from app.services.detect import MODEL_WARMUP, warm_models
 import os
+import threading
 
 app = FastAPI(title="cv1 Project Backend")
 
@@ -19,6 +27,7 @@ app.include_router(detect_router, prefix="/api")
 app.include_router(stream_router, prefix="/api")
 app.include_router(train_router, prefix="/api")
 app.include_router(label_status_router, prefix="/api")
+app.include_router(dataset_router, prefix="/api")
 
 app.add_middleware(
     CORSMiddleware,
@@ -37,3 +46,35 @@ app.mount("/user_images", StaticFiles(directory=DATA_USER_IMG), name="user_image
 @app.get("/")
 def root():
     return {"message": "Backend running"}
+
+
+@app.on_event("startup")
+def load_cameras():
+    camera_hub.load()
+
+
+@app.on_event("startup")
+def start_model_warmup():
+    # off-thread: the server accepts requests right away, /api/detect/ready reports progress
+    if MODEL_WARMUP:
+        warm_models()
+
+
+@app.on_event("startup")
+def start_reference_area_bootstrap():
+    # first run after deploy: seed the online median from the dataset labels off the request path
+    reference_area.start_bootstrap()
+
+
+@app.on_event("startup")
+def start_blob_gc():
+    # orphans left inside the gc grace window by the last run are freed here
+    threading.Thread(target=blob_store.gc, daemon=True, name="blob-gc").start()
+
+
+@app.on_event("shutdown")
+def shutdown_pool():
+    inference_pool.shutdown()
+    stream_manager.stop_all()
+    live_hub.stop_all()
+    camera_hub.stop()
@@ -1,19 +1,35 @@
 # backend/app/services/auto_label.py
 import os
 import cv2
-import json
+import queue
+import threading
+import multiprocessing
 import numpy as np
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+
+from app.services import blob_store, low_conf_store
+from app.utils.db import connect
+from app.utils.label_io import write_label
 
 # Paths (relative to backend working dir)
 CACHE_DIR = os.path.join("data", "cache")
 FINAL_IMG_DIR = os.path.join("data", "user_object", "images")
 FINAL_LABEL_DIR = os.path.join("data", "user_object", "labels")
-LOW_CONF_FILE = os.path.join("data", "user_object", "low_conf.json")
 
 # Parameters / thresholds
 MIN_AREA_RATIO = 0.01   # if contour area < 1% of image area => low confidence
 EDGE_MARGIN_RATIO = 0.98  # if bbox touches nearly full image (>=98%) => low confidence
 
+# Fast mode: run the contour pipeline on a downscaled pyramid level
+# (see benchmark_auto_label.py for the speed/accuracy tradeoff)
+AUTO_LABEL_FAST = os.environ.get("AUTO_LABEL_FAST", "0") == "1"
+FAST_MAX_SIDE = int(os.environ.get("AUTO_LABEL_FAST_MAX_SIDE", 1024))
+
+# Parallel labeling (contour pipeline is pure CPU → process pool)
+AUTO_LABEL_WORKERS = int(os.environ.get("AUTO_LABEL_WORKERS", os.cpu_count() or 1))
+INPUT_POLL_S = 0.05     # max delay picking up a new input path while a result is pending
+
 def ensure_dirs():
     os.makedirs(CACHE_DIR, exist_ok=True)
     os.makedirs(FINAL_IMG_DIR, exist_ok=True)
@@ -26,16 +42,28 @@ def _to_yolo_format(x, y, w, h, img_w, img_h):
     nh = h / img_h
     return xc, yc, nw, nh
 
-def contour_auto_label(image_path):
+def _downscale(img, max_side):
+    """pyrDown until the longest side is <= max_side; returns (small_img, sx, sy)."""
+    h, w = img.shape[:2]
+    small = img
+    while max(small.shape[:2]) > max_side:
+        small = cv2.pyrDown(small)
+    sh, sw = small.shape[:2]
+    return small, w / sw, h / sh
+
+def contour_geometry(img, fast=False):
     """
-    Returns: (success:bool, label_line:str or reason:str, bbox_px:tuple)
-    label_line = "0 xc yc w h" (YOLO normalized) if success
+    The expensive part: blur → adaptive threshold → morph-close → largest contour.
+    Returns (area, bbox(x,y,w,h)) of the largest contour, or (None, None).
+    Independent of MIN_AREA_RATIO / EDGE_MARGIN_RATIO, so it can be cached.
+
+    fast=True runs the same pipeline on a pyramid level whose longest side is
+    <= FAST_MAX_SIDE and maps area/bbox back to full resolution.
     """
-    img = cv2.imread(image_path)
-    if img is None:
-        return False, "cannot_read_image", None
+    sx = sy = 1.0
+    if fast:
+        img, sx, sy = _downscale(img, FAST_MAX_SIDE)
 
-    h, w = img.shape[:2]
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
     blur = cv2.GaussianBlur(gray, (5,5), 0)
 
@@ -50,13 +78,29 @@ def contour_auto_label(image_path):
 
     cnts, _ = cv2.findContours(closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     if not cnts:
-        return False, "no_contours_found", None
+        return None, None
+
+    # pick largest contour (single argmax, no full sort)
+    areas = np.fromiter((cv2.contourArea(c) for c in cnts), dtype=np.float64, count=len(cnts))
+    i = int(areas.argmax())
+    x, y, bw, bh = cv2.boundingRect(cnts[i])
 
-    # pick largest contour
-    cnts = sorted(cnts, key=cv2.contourArea, reverse=True)
-    c = cnts[0]
-    area = cv2.contourArea(c)
-    bbox = cv2.boundingRect(c)  # x,y,w,h
+    if fast:
+        H, W = int(round(img.shape[0] * sy)), int(round(img.shape[1] * sx))
+        x0, y0 = int(x * sx), int(y * sy)
+        x1, y1 = min(W, int(round((x + bw) * sx))), min(H, int(round((y + bh) * sy)))
+        return float(areas[i] * sx * sy), (x0, y0, x1 - x0, y1 - y0)
+
+    return float(areas[i]), (int(x), int(y), int(bw), int(bh))
+
+def classify_geometry(area, bbox, dims):
+    """
+    The cheap part: apply the confidence heuristics to a contour geometry.
+    Returns (success, label_line or reason, bbox, dims) like contour_auto_label.
+    """
+    w, h = dims
+    if bbox is None:
+        return False, "no_contours_found", None, dims
 
     # Heuristics for confidence
     img_area = h * w
@@ -67,14 +111,207 @@ def contour_auto_label(image_path):
 
     # Low confidence if contour too small or bbox touches edges or bbox occupies almost full image
     if area_ratio < MIN_AREA_RATIO:
-        return False, "small_contour", bbox
+        return False, "small_contour", bbox, dims
     if big_bbox_ratio or touches_edge:
-        return False, "bbox_touches_edge_or_full", bbox
+        return False, "bbox_touches_edge_or_full", bbox, dims
 
     # Convert to yolo normalized
     xc, yc, nw, nh = _to_yolo_format(x, y, bw, bh, w, h)
     label_line = f"0 {xc:.6f} {yc:.6f} {nw:.6f} {nh:.6f}"
-    return True, label_line, bbox
+    return True, label_line, bbox, dims
+
+def contour_auto_label(image_path, fast=None):
+    """
+    Returns: (success:bool, label_line:str or reason:str, bbox_px:tuple, dims:(w,h))
+    label_line = "0 xc yc w h" (YOLO normalized) if success
+    dims is None only when the image cannot be read.
+    fast=None follows AUTO_LABEL_FAST.
+    """
+    img = cv2.imread(image_path)
+    if img is None:
+        return False, "cannot_read_image", None, None
+
+    h, w = img.shape[:2]
+    area, bbox = contour_geometry(img, AUTO_LABEL_FAST if fast is None else fast)
+    return classify_geometry(area, bbox, (w, h))
+
+# =====================================================================
+# GEOMETRY CACHE  (image hash, pipeline version) → contour geometry
+#
+# Thresholds are applied AFTER the cache (classify_geometry), so tuning
+# MIN_AREA_RATIO / EDGE_MARGIN_RATIO never forces a re-run of the pipeline.
+# Bump PIPELINE_VERSION whenever contour_geometry() changes; fast mode
+# results are cached under their own key.
+# =====================================================================
+PIPELINE_VERSION = 1
+GEOMETRY_CACHE_DB = os.path.join("data", "auto_label_cache.db")
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS geometry (
+    hash TEXT NOT NULL,
+    version TEXT NOT NULL,
+    w INTEGER NOT NULL,
+    h INTEGER NOT NULL,
+    area REAL,
+    bx INTEGER, "by" INTEGER, bw INTEGER, bh INTEGER,
+    PRIMARY KEY (hash, version)
+);
+"""
+
+def _cache_db():
+    return connect(GEOMETRY_CACHE_DB, _CACHE_SCHEMA)
+
+def _pipeline_key(fast):
+    return f"{PIPELINE_VERSION}:fast{FAST_MAX_SIDE}" if fast else f"{PIPELINE_VERSION}:full"
+
+def _image_hash(image_path):
+    """Hash from the blob index when the file came through it, else hash the bytes."""
+    folder, name = os.path.split(image_path)
+    try:
+        return blob_store.lookup(folder, name) or blob_store.hash_file(image_path)
+    except OSError:
+        return None
+
+def cache_get(digest, fast=False):
+    """Cached (area, bbox, dims) for this content + pipeline version, or None."""
+    if digest is None:
+        return None
+    r = _cache_db().execute(
+        'SELECT w, h, area, bx, "by", bw, bh FROM geometry WHERE hash=? AND version=?',
+        (digest, _pipeline_key(fast))).fetchone()
+    if r is None:
+        return None
+    bbox = None if r["bx"] is None else (r["bx"], r["by"], r["bw"], r["bh"])
+    return r["area"], bbox, (r["w"], r["h"])
+
+def cache_put(digest, area, bbox, dims, fast=False):
+    if digest is None:
+        return
+    bx, by, bw, bh = bbox if bbox is not None else (None, None, None, None)
+    db = _cache_db()
+    with db:
+        db.execute('INSERT OR REPLACE INTO geometry(hash, version, w, h, area, bx, "by", bw, bh) '
+                   'VALUES (?,?,?,?,?,?,?,?,?)',
+                   (digest, _pipeline_key(fast), dims[0], dims[1], area, bx, by, bw, bh))
+
+def _init_label_worker():
+    # one process per core already → keep OpenCV single-threaded inside each
+    cv2.setNumThreads(1)
+
+def _safe_contour_geometry(image_path, fast=False):
+    """
+    Pool worker: never raise, so one bad image cannot stop the whole run.
+    Returns ("ok", area, bbox, dims) | ("unreadable",) | ("error", message).
+    """
+    try:
+        img = cv2.imread(image_path)
+        if img is None:
+            return ("unreadable",)
+        h, w = img.shape[:2]
+        area, bbox = contour_geometry(img, fast)
+        return ("ok", area, bbox, (w, h))
+    except Exception as e:
+        return ("error", str(e))
+
+def _finish(digest, geo, fast=False):
+    """Worker output → cache (if computed) → contour_auto_label-style result."""
+    if geo[0] == "cached":
+        return classify_geometry(*geo[1:])
+    if geo[0] == "unreadable":
+        return False, "cannot_read_image", None, None
+    if geo[0] == "error":
+        return False, f"error:{geo[1]}", None, None
+    _, area, bbox, dims = geo
+    cache_put(digest, area, bbox, dims, fast)
+    return classify_geometry(area, bbox, dims)
+
+def contour_auto_label_many(image_paths, workers=None, stats=None, fast=None):
+    """
+    Run contour_auto_label over many images on a process pool.
+    `image_paths` may be a list or any (blocking) iterable, e.g. paths fed while an
+    upload is still streaming in: each path is submitted as soon as it arrives.
+    Images whose content was already processed come from the geometry cache.
+    Yields (image_path, result) in INPUT order, as soon as each is ready.
+    `stats` (optional dict) receives {"cached": n, "computed": n}.
+    fast=None follows AUTO_LABEL_FAST.
+    """
+    fast = AUTO_LABEL_FAST if fast is None else fast
+    if stats is None:
+        stats = {}
+    stats.setdefault("cached", 0)
+    stats.setdefault("computed", 0)
+
+    workers = workers or AUTO_LABEL_WORKERS
+    if isinstance(image_paths, (list, tuple)):
+        workers = min(workers, len(image_paths))
+
+    if workers <= 1:
+        for p in image_paths:
+            digest = _image_hash(p)
+            hit = cache_get(digest, fast)
+            if hit is not None:
+                stats["cached"] += 1
+                yield p, classify_geometry(*hit)
+            else:
+                stats["computed"] += 1
+                yield p, _finish(digest, _safe_contour_geometry(p, fast), fast)
+        return
+
+    # a blocking iterable is read on its own thread, so results that finish
+    # while the next path has not arrived yet are still handed back at once
+    inbox = queue.Queue()
+    end = object()
+
+    def feed():
+        try:
+            for p in image_paths:
+                inbox.put(p)
+        except BaseException as e:
+            inbox.put(e)
+        inbox.put(end)
+
+    threading.Thread(target=feed, daemon=True, name="auto-label-input").start()
+
+    # spawn: the API process may hold torch/model threads that must not be forked
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_label_worker) as ex:
+        pending = deque()
+        ended = False
+        while True:
+            # hand back whatever is already finished at the head (keeps order)
+            while pending and pending[0][2].done():
+                q, d, f = pending.popleft()
+                yield q, _finish(d, f.result(), fast)
+            if ended and not pending:
+                return
+
+            block = not pending
+            if pending:
+                wait([pending[0][2]], timeout=None if ended else INPUT_POLL_S,
+                     return_when=FIRST_COMPLETED)
+            # take every path that has arrived (block only when nothing is in flight)
+            while not ended:
+                try:
+                    p = inbox.get(block=block)
+                except queue.Empty:
+                    break
+                block = False
+                if p is end:
+                    ended = True
+                    break
+                if isinstance(p, BaseException):
+                    raise p
+                digest = _image_hash(p)
+                hit = cache_get(digest, fast)
+                if hit is not None:
+                    stats["cached"] += 1
+                    fut = Future()
+                    fut.set_result(("cached",) + hit)
+                else:
+                    stats["computed"] += 1
+                    fut = ex.submit(_safe_contour_geometry, p, fast)
+                pending.append((p, digest, fut))
 
 def save_label_and_move(image_filename, label_line):
     """
@@ -82,60 +319,47 @@ def save_label_and_move(image_filename, label_line):
     Returns dict with status info.
     """
     ensure_dirs()
-    src_img = os.path.join(CACHE_DIR, image_filename)
-    name, _ = os.path.splitext(image_filename)
+    # move image (blob-store link; name may change if another image owns it)
+    final_name = blob_store.move(CACHE_DIR, image_filename, FINAL_IMG_DIR)
+    name, _ = os.path.splitext(final_name)
     label_path = os.path.join(FINAL_LABEL_DIR, f"{name}.txt")
-    dst_img = os.path.join(FINAL_IMG_DIR, image_filename)
     # write label
-    with open(label_path, "w") as f:
-        f.write(label_line + "\n")
-    # move image
-    os.replace(src_img, dst_img)
-    return {"image": image_filename, "label": os.path.basename(label_path)}
+    write_label(label_path, label_line + "\n")
+    return {"image": final_name, "label": os.path.basename(label_path)}
 
 def mark_low_conf(image_filename, reason, bbox=None):
     """
-    Record low confidence cases in a JSON for manual correction UI to pick up.
+    Record low confidence cases in the review queue for the manual correction UI.
     """
     ensure_dirs()
-    record = {"image": image_filename, "reason": reason, "bbox_px": bbox}
-    data = []
-    if os.path.exists(LOW_CONF_FILE):
-        try:
-            with open(LOW_CONF_FILE, "r") as f:
-                data = json.load(f)
-        except Exception:
-            data = []
-    data.append(record)
-    with open(LOW_CONF_FILE, "w") as f:
-        json.dump(data, f, indent=2)
     # Move the image to same final images folder so manual UI can fetch it
-    src_img = os.path.join(CACHE_DIR, image_filename)
-    dst_img = os.path.join(FINAL_IMG_DIR, image_filename)
-    if os.path.exists(src_img):
-        os.replace(src_img, dst_img)
-    return record
+    if os.path.exists(os.path.join(CACHE_DIR, image_filename)):
+        image_filename = blob_store.move(CACHE_DIR, image_filename, FINAL_IMG_DIR)
+    return low_conf_store.upsert(image_filename, reason, bbox)
 
 def run_auto_label_all():
     """
-    Iterate through all images in CACHE_DIR and auto-label them.
+    Iterate through all images in CACHE_DIR and auto-label them (in parallel).
     Returns summary dict with successes and low_conf list.
     """
     ensure_dirs()
-    results = {"success": [], "low_conf": [], "errors": []}
-    for fname in os.listdir(CACHE_DIR):
-        if fname.lower().endswith((".jpg", ".jpeg", ".png")):
-            try:
-                path = os.path.join(CACHE_DIR, fname)
-                ok, info, bbox = contour_auto_label(path)
-                if ok:
-                    saved = save_label_and_move(fname, info)
-                    results["success"].append(saved)
-                else:
-                    rec = mark_low_conf(fname, info, bbox)
-                    results["low_conf"].append(rec)
-            except Exception as e:
-                results["errors"].append({"image": fname, "error": str(e)})
+    results = {"success": [], "low_conf": [], "errors": [], "cache": {}}
+    fnames = [f for f in os.listdir(CACHE_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    paths = [os.path.join(CACHE_DIR, f) for f in fnames]
+
+    for fname, (_, res) in zip(fnames, contour_auto_label_many(paths, stats=results["cache"])):
+        try:
+            ok, info, bbox, _ = res
+            if not ok and info.startswith("error:"):
+                raise RuntimeError(info[len("error:"):])
+            if ok:
+                saved = save_label_and_move(fname, info)
+                results["success"].append(saved)
+            else:
+                rec = mark_low_conf(fname, info, bbox)
+                results["low_conf"].append(rec)
+        except Exception as e:
+            results["errors"].append({"image": fname, "error": str(e)})
     return results
 
 def auto_label_images(image_dir, label_dir):
@@ -148,25 +372,24 @@ def auto_label_images(image_dir, label_dir):
     os.makedirs(label_dir, exist_ok=True)
     low_conf = []
 
-    for fname in os.listdir(image_dir):
-        if fname.lower().endswith((".jpg", ".jpeg", ".png")):
-            img_path = os.path.join(image_dir, fname)
+    fnames = [f for f in os.listdir(image_dir) if f.lower().endswith((".jpg", ".jpeg", ".png"))]
+    paths = [os.path.join(image_dir, f) for f in fnames]
 
-            ok, info, bbox = contour_auto_label(img_path)
+    for fname, (_, res) in zip(fnames, contour_auto_label_many(paths)):
+        ok, info, bbox, _ = res
 
-            name, _ = os.path.splitext(fname)
-            label_path = os.path.join(label_dir, f"{name}.txt")
+        name, _ = os.path.splitext(fname)
+        label_path = os.path.join(label_dir, f"{name}.txt")
 
-            if ok:
-                # Write YOLO normalized label for training
-                with open(label_path, "w") as f:
-                    f.write(info + "\n")
-            else:
-                # Record low confidence
-                low_conf.append({
-                    "image": fname,
-                    "reason": info,
-                    "bbox_px": bbox
-                })
+        if ok:
+            # Write YOLO normalized label for training
+            write_label(label_path, info + "\n")
+        else:
+            # Record low confidence
+            low_conf.append({
+                "image": fname,
+                "reason": info,
+                "bbox_px": bbox
+            })
 
     return low_conf
@@ -0,0 +1,111 @@
+# backend/app/services/batcher.py
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from app.services import inference_pool
+
+# =====================================================================
+# CONFIG (override with env vars)
+# =====================================================================
+BATCH_MAX_SIZE = int(os.environ.get("DETECT_BATCH_MAX_SIZE", 8))     # images per forward pass
+BATCH_WAIT_MS = float(os.environ.get("DETECT_BATCH_WAIT_MS", 5))     # coalescing window
+
+
+class MicroBatcher:
+    """
+    Coalesces single-image requests into batches.
+
+    The first request opens a window of `wait_ms`; every request arriving before
+    the window closes (or until `max_size` is reached) joins the same batch.
+    Each batch runs ONCE through `batch_fn(images, *params)` on the inference
+    pool and every waiter gets its own slice of the result list.
+    Requests with different params (e.g. conf threshold) never share a batch.
+    """
+
+    def __init__(self, batch_fn, max_size=BATCH_MAX_SIZE, wait_ms=BATCH_WAIT_MS):
+        self.batch_fn = batch_fn
+        self.max_size = max(1, max_size)
+        self.wait_s = max(0.0, wait_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats = {"batches": 0, "images": 0, "max_seen": 0}
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name="micro-batcher")
+                self._thread.start()
+
+    def submit(self, image, *params):
+        """Queue one image; returns a Future resolving to that image's result."""
+        self._ensure_thread()
+        fut = Future()
+        self._queue.put((image, params, fut))
+        return fut
+
+    # ------------------------------------------------------------
+    # Collector thread
+    # ------------------------------------------------------------
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]           # block until the first request
+            deadline = time.monotonic() + self.wait_s
+
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # group by params so one forward pass uses one conf/iou setting
+            groups = {}
+            for image, params, fut in batch:
+                # skip waiters that timed out / were cancelled while queued
+                if fut.set_running_or_notify_cancel():
+                    groups.setdefault(params, []).append((image, fut))
+
+            for params, items in groups.items():
+                self._dispatch(params, items)
+
+    def _dispatch(self, params, items):
+        images = [img for img, _ in items]
+        futs = [f for _, f in items]
+
+        with self._lock:
+            self._stats["batches"] += 1
+            self._stats["images"] += len(items)
+            self._stats["max_seen"] = max(self._stats["max_seen"], len(items))
+
+        def _fan_out(batch_fut):
+            try:
+                results = batch_fut.result()
+            except BaseException as e:
+                for f in futs:
+                    f.set_exception(e)
+                return
+            for f, res in zip(futs, results):
+                f.set_result(res)
+
+        try:
+            batch_fut = inference_pool.get_executor().submit(self.batch_fn, images, *params)
+        except Exception as e:
+            for f in futs:
+                f.set_exception(e)
+            return
+        batch_fut.add_done_callback(_fan_out)
+
+    def stats(self):
+        with self._lock:
+            s = dict(self._stats)
+        s["avg_batch"] = round(s["images"] / s["batches"], 2) if s["batches"] else 0
+        s["max_size"] = self.max_size
+        s["wait_ms"] = self.wait_s * 1000
+        return s
@@ -0,0 +1,237 @@
+# backend/app/services/blob_store.py
+import os
+import time
+import uuid
+import shutil
+import hashlib
+
+from app.utils.db import connect
+
+# =====================================================================
+# Content-addressed image store
+#
+#   data/blobs/<h[:2]>/<sha256><ext>   ← one physical copy per content
+#   index.db: names(dir, name) → hash  ← what each working folder holds
+#
+# Working folders (cache, train_tmp/images, user_object/images, detect_input)
+# only hold HARD LINKS to blobs, so the same image costs disk space once.
+# =====================================================================
+BLOB_DIR = os.path.join("data", "blobs")
+INDEX_DB = os.path.join(BLOB_DIR, "index.db")
+CHUNK = 1024 * 1024
+GC_GRACE_S = 300       # gc() leaves blobs this fresh alone (ingested, not placed yet)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    ext TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    PRIMARY KEY (dir, name)
+);
+CREATE INDEX IF NOT EXISTS names_by_hash ON names (dir, hash);
+"""
+
+
+def _db():
+    return connect(INDEX_DB, _SCHEMA)
+
+
+def _norm_dir(d):
+    return os.path.normpath(d).replace("\\", "/")
+
+
+def hasher():
+    """Incremental hasher: feed chunks while streaming, then .hexdigest()."""
+    return hashlib.sha256()
+
+
+def hash_file(path):
+    h = hasher()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_path(digest, ext):
+    return os.path.join(BLOB_DIR, digest[:2], digest + ext.lower())
+
+
+def _link(src, dst):
+    """Hard-link (same inode, no extra bytes); copy where links are unsupported."""
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+# =====================================================================
+# INGEST
+# =====================================================================
+def ingest_file(src_path, digest=None, ext=None):
+    """
+    Move a finished file into the blob store (src is consumed).
+    Returns its hash; if the content is already stored, src is just deleted.
+    """
+    digest = digest or hash_file(src_path)
+    ext = (ext if ext is not None else os.path.splitext(src_path)[1]).lower()
+    dst = blob_path(digest, ext)
+
+    db = _db()
+    row = db.execute("SELECT ext FROM blobs WHERE hash=?", (digest,)).fetchone()
+    if row and os.path.exists(blob_path(digest, row["ext"])):
+        os.remove(src_path)
+        with db:    # re-ingested: protect it from gc() until it is placed
+            db.execute("UPDATE blobs SET created=? WHERE hash=?", (time.time(), digest))
+        return digest
+
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    size = os.path.getsize(src_path)
+    os.replace(src_path, dst)
+    with db:
+        db.execute("INSERT OR REPLACE INTO blobs(hash, ext, size, created) VALUES (?,?,?,?)",
+                   (digest, ext, size, time.time()))
+    return digest
+
+
+def ingest_bytes(data, ext):
+    """Store raw bytes; returns hash."""
+    digest = hash_bytes(data)
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    tmp = os.path.join(BLOB_DIR, f".incoming_{uuid.uuid4().hex}")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    return ingest_file(tmp, digest, ext)
+
+
+# =====================================================================
+# NAME INDEX (per working folder)
+# =====================================================================
+def place(digest, folder, name):
+    """
+    Make `folder/name` point at blob `digest`.
+    Returns (final_name, status):
+      "duplicate" – folder already holds this content (final_name = existing name), nothing written
+      "linked"    – linked under the requested name
+      "renamed"   – requested name held OTHER content → linked as <stem>_<hash8><ext>
+    """
+    folder_key = _norm_dir(folder)
+    db = _db()
+    row = db.execute("SELECT ext FROM blobs WHERE hash=?", (digest,)).fetchone()
+    if row is None:
+        raise KeyError(f"unknown blob: {digest}")
+    src = blob_path(digest, row["ext"])
+
+    # same content already in this folder (under any name) → skip
+    for r in db.execute("SELECT name FROM names WHERE dir=? AND hash=?", (folder_key, digest)):
+        if os.path.exists(os.path.join(folder, r["name"])):
+            return r["name"], "duplicate"
+
+    status = "linked"
+    final = os.path.basename(name)
+    taken = db.execute("SELECT hash FROM names WHERE dir=? AND name=?",
+                       (folder_key, final)).fetchone()
+    on_disk = os.path.exists(os.path.join(folder, final))
+    if on_disk and (taken is None or taken["hash"] != digest):
+        stem, ext = os.path.splitext(final)
+        final = f"{stem}_{digest[:8]}{ext}"
+        status = "renamed"
+
+    os.makedirs(folder, exist_ok=True)
+    _link(src, os.path.join(folder, final))
+    with db:
+        db.execute("INSERT OR REPLACE INTO names(dir, name, hash) VALUES (?,?,?)",
+                   (folder_key, final, digest))
+    return final, status
+
+
+def store_file(src_path, folder, name, digest=None):
+    """ingest_file + place in one call → {"name", "hash", "status"}."""
+    digest = ingest_file(src_path, digest, os.path.splitext(name)[1])
+    final, status = place(digest, folder, name)
+    return {"name": final, "hash": digest, "status": status}
+
+
+def move(src_folder, name, dst_folder):
+    """
+    Move folder entry `name` (like os.replace) and keep the index in sync.
+    Returns the final name in dst_folder (may differ on a name collision).
+    """
+    src = os.path.join(src_folder, name)
+    db = _db()
+    row = db.execute("SELECT hash FROM names WHERE dir=? AND name=?",
+                     (_norm_dir(src_folder), name)).fetchone()
+    digest = row["hash"] if row else None
+
+    if digest is None:
+        # file that never went through the store (legacy) → ingest now
+        if not os.path.exists(src):
+            raise FileNotFoundError(src)
+        tmp = src + ".ingest"
+        os.replace(src, tmp)
+        digest = ingest_file(tmp, ext=os.path.splitext(name)[1])
+    elif os.path.exists(src):
+        os.remove(src)
+
+    # link the destination first so the blob is never unreferenced (gc-safe)
+    final, _ = place(digest, dst_folder, name)
+    forget(src_folder, name)
+    return final
+
+
+def forget(folder, name):
+    with _db() as db:
+        db.execute("DELETE FROM names WHERE dir=? AND name=?", (_norm_dir(folder), name))
+
+
+def forget_dir(folder):
+    """Drop every index entry of a folder (call after clearing it)."""
+    with _db() as db:
+        db.execute("DELETE FROM names WHERE dir=?", (_norm_dir(folder),))
+
+
+def lookup(folder, name):
+    row = _db().execute("SELECT hash FROM names WHERE dir=? AND name=?",
+                        (_norm_dir(folder), name)).fetchone()
+    return row["hash"] if row else None
+
+
+def gc(grace_s=GC_GRACE_S):
+    """
+    Delete blobs no longer linked from any folder. Returns number removed.
+    Blobs ingested in the last `grace_s` seconds are kept (a concurrent
+    ingest + place may not have linked them yet).
+    """
+    db = _db()
+    removed = 0
+    orphans = db.execute(
+        "SELECT hash, ext FROM blobs WHERE created < ? "
+        "AND hash NOT IN (SELECT DISTINCT hash FROM names)", (time.time() - grace_s,)
+    ).fetchall()
+    for r in orphans:
+        p = blob_path(r["hash"], r["ext"])
+        if os.path.exists(p):
+            os.remove(p)
+        with db:
+            db.execute("DELETE FROM blobs WHERE hash=?", (r["hash"],))
+        removed += 1
+    return removed
+
+
+def stats():
+    db = _db()
+    blobs, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM blobs").fetchone()
+    names = db.execute("SELECT COUNT(*) FROM names").fetchone()[0]
+    return {"blobs": blobs, "bytes": size, "names": names}
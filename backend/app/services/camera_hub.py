@@ -0,0 +1,243 @@
+# backend/app/services/camera_hub.py
+import os
+import json
+import time
+import threading
+from collections import deque
+
+from app.services import inference_pool
+from app.services.detect import detect_batch, INFER_IMGSZ
+from app.services.stream_manager import stream_manager
+
+# =====================================================================
+# CONFIG (override with env vars)
+# =====================================================================
+CAMERAS_FILE = os.path.join("data", "cameras.json")
+HUB_BATCH_SIZE = int(os.environ.get("HUB_BATCH_SIZE", 4))       # cameras per forward pass
+HUB_CONF = float(os.environ.get("HUB_CONF", 0.25))
+HUB_IDLE_SLEEP = 0.02                                            # no new frames anywhere
+HUB_STALE_AFTER = 10.0                                           # s without a result → unhealthy
+
+
+class CameraHub:
+    """
+    Named cameras sharing ONE inference loop.
+
+    The scheduler walks the cameras round-robin, takes up to HUB_BATCH_SIZE
+    cameras that have a NEW frame since their last result, and runs them as a
+    single detect_batch() on the shared inference pool. The rotation continues
+    after the last camera served, so every camera gets its turn even when there
+    are more cameras than batch slots.
+    """
+
+    def __init__(self, batch_size=HUB_BATCH_SIZE, conf=HUB_CONF):
+        self.batch_size = max(1, batch_size)
+        self.conf = conf
+        self._cams = {}              # name -> state dict
+        self._order = deque()        # round-robin rotation of names
+        self._lock = threading.Lock()
+        self._results = threading.Condition(self._lock)   # notified when a batch lands
+        self._thread = None
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------
+    # Registration
+    # ------------------------------------------------------------
+    def register(self, name, url, persist=True):
+        with self._lock:
+            old = self._cams.get(name)
+            if name not in self._cams:
+                self._order.append(name)
+            self._cams[name] = {
+                "url": url,
+                "last_frame_id": 0,
+                "result": None,
+                "result_ts": None,
+                "processed": 0,
+                "errors": 0,
+                "last_error": None,
+                "latency_ms": None,
+            }
+        stream_manager.acquire(url)      # start reading right away; held while registered
+        if old:
+            # other consumers (live viewers, cameras) of the old URL keep their reader
+            stream_manager.release(old["url"])
+        self._ensure_thread()
+        if persist:
+            self._save()
+        return True
+
+    def unregister(self, name):
+        with self._lock:
+            cam = self._cams.pop(name, None)
+            if cam is None:
+                return False
+            self._order.remove(name)
+            self._results.notify_all()      # live viewers waiting on it fall back
+        stream_manager.release(cam["url"])
+        self._save()
+        return True
+
+    def _save(self):
+        with self._lock:
+            data = {n: c["url"] for n, c in self._cams.items()}
+        try:
+            os.makedirs(os.path.dirname(CAMERAS_FILE), exist_ok=True)
+            tmp = CAMERAS_FILE + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, CAMERAS_FILE)
+        except Exception as e:
+            print("WARN: failed to save cameras:", e)
+
+    def load(self):
+        """Re-register cameras saved in CAMERAS_FILE (called on startup)."""
+        if not os.path.exists(CAMERAS_FILE):
+            return 0
+        try:
+            with open(CAMERAS_FILE, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            print("WARN: cannot read cameras file:", e)
+            return 0
+        for name, url in data.items():
+            self.register(name, url, persist=False)
+        return len(data)
+
+    # ------------------------------------------------------------
+    # Scheduler
+    # ------------------------------------------------------------
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._loop, daemon=True,
+                                                name="camera-hub")
+                self._thread.start()
+
+    def _pick_batch(self):
+        """Next cameras (round-robin) that have an unprocessed frame."""
+        picked = []
+        with self._lock:
+            n = len(self._order)
+            for _ in range(n):
+                name = self._order[0]
+                self._order.rotate(-1)
+                cam = self._cams[name]
+                frame, frame_id, _ = stream_manager.get(cam["url"]).latest(wait=0)
+                if frame is not None and frame_id != cam["last_frame_id"]:
+                    picked.append((name, frame, frame_id))
+                    if len(picked) >= self.batch_size:
+                        break
+        return picked
+
+    def _loop(self):
+        while not self._stop.is_set():
+            with self._lock:
+                if not self._cams:
+                    self._thread = None
+                    return
+            picked = self._pick_batch()
+            if not picked:
+                self._stop.wait(HUB_IDLE_SLEEP)
+                continue
+
+            frames = [f for _, f, _ in picked]
+            t0 = time.perf_counter()
+            try:
+                # same admission as requests: counted in /detect/pool, bounded by the queue
+                fut = inference_pool.submit(detect_batch, frames, self.conf)
+            except inference_pool.PoolFull:
+                # saturated by requests → back off, the cameras are picked again with newer frames
+                self._stop.wait(HUB_IDLE_SLEEP)
+                continue
+            try:
+                results = fut.result(timeout=inference_pool.REQUEST_TIMEOUT)
+                error = None
+            except Exception as e:
+                fut.cancel()
+                results = [None] * len(picked)
+                error = str(e) or e.__class__.__name__
+            latency = (time.perf_counter() - t0) * 1000.0
+
+            now = time.time()
+            with self._lock:
+                for (name, _, frame_id), res in zip(picked, results):
+                    cam = self._cams.get(name)
+                    if cam is None:
+                        continue   # unregistered while in flight
+                    cam["last_frame_id"] = frame_id
+                    if error:
+                        cam["errors"] += 1
+                        cam["last_error"] = error
+                        continue
+                    cam["result"] = res
+                    cam["result_ts"] = now
+                    cam["processed"] += 1
+                    cam["latency_ms"] = round(latency, 2)
+                self._results.notify_all()
+
+    def stop(self):
+        self._stop.set()
+
+    def wait_result(self, url, min_frame_id, conf, imgsz, timeout):
+        """
+        Share the hub's inference with other consumers of `url` (live viewers):
+        waits until a hub camera on `url` has processed frame `min_frame_id`
+        or a newer one. Returns (True, result), (True, None) on timeout, or
+        (False, None) when no hub camera runs `url` with this conf/imgsz.
+        """
+        if conf != self.conf or imgsz != INFER_IMGSZ:
+            return False, None
+        deadline = time.monotonic() + timeout
+        with self._results:
+            while True:
+                cams = [c for c in self._cams.values() if c["url"] == url]
+                if not cams or self._stop.is_set():
+                    return False, None
+                for c in cams:
+                    if c["last_frame_id"] >= min_frame_id and c["result_ts"]:
+                        return True, c["result"]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return True, None
+                self._results.wait(remaining)
+
+    # ------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------
+    def _health(self, cam):
+        # peek: a health query must not (re)start a reader
+        r = stream_manager.peek(cam["url"])
+        reader = r.info() if r else {"opened": False, "error": "no_reader", "frames": 0,
+                                     "last_frame_age": None}
+        age = (time.time() - cam["result_ts"]) if cam["result_ts"] else None
+        return {
+            "stream_open": reader["opened"],
+            "stream_error": reader["error"],
+            "frames_read": reader["frames"],
+            "last_frame_age": reader["last_frame_age"],
+            "processed": cam["processed"],
+            "errors": cam["errors"],
+            "last_error": cam["last_error"],
+            "latency_ms": cam["latency_ms"],
+            "result_age": age,
+            "healthy": bool(reader["opened"] and age is not None and age < HUB_STALE_AFTER),
+        }
+
+    def get(self, name):
+        with self._lock:
+            cam = self._cams.get(name)
+            if cam is None:
+                return None
+            cam = dict(cam)
+        return {"name": name, "url": cam["url"], "result": cam["result"],
+                "result_ts": cam["result_ts"], "health": self._health(cam)}
+
+    def list(self):
+        with self._lock:
+            names = list(self._cams)
+        return [c for c in (self.get(n) for n in names) if c is not None]
+
+
+camera_hub = CameraHub()
@@ -0,0 +1,258 @@
+# backend/app/services/dataset_index.py
+import os
+import threading
+
+from PIL import Image
+
+from app.services import blob_store
+from app.utils.db import connect
+
+# =====================================================================
+# Persistent dataset index (images + parsed YOLO labels)
+#
+#   refresh() stats both folders and only re-reads files whose
+#   (mtime, size) changed, so validation and statistics become SQL
+#   queries instead of a full rescan + re-parse of every label.
+# =====================================================================
+IMG_DIR = os.path.join("data", "user_object", "images")
+LABEL_DIR = os.path.join("data", "user_object", "labels")
+DATASET_DB = os.path.join("data", "user_object", "dataset.db")
+
+IMG_EXTS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+COORD_EPS = 1e-6
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    name TEXT PRIMARY KEY,
+    stem TEXT NOT NULL,
+    w INTEGER,
+    h INTEGER,
+    hash TEXT,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_by_stem ON images (stem);
+CREATE TABLE IF NOT EXISTS labels (
+    stem TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    error TEXT,
+    nboxes INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS labels_by_status ON labels (status);
+CREATE TABLE IF NOT EXISTS boxes (
+    stem TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    cls INTEGER NOT NULL,
+    xc REAL NOT NULL,
+    yc REAL NOT NULL,
+    w REAL NOT NULL,
+    h REAL NOT NULL,
+    area REAL NOT NULL,
+    valid INTEGER NOT NULL,
+    PRIMARY KEY (stem, idx)
+);
+CREATE INDEX IF NOT EXISTS boxes_by_area ON boxes (valid, area);
+CREATE INDEX IF NOT EXISTS boxes_by_cls ON boxes (valid, cls);
+"""
+
+
+def parse_label(text):
+    """
+    YOLO label text → (status, error, boxes).
+    status: "ok" | "empty" | "malformed" | "out_of_range"
+    boxes: [(cls, xc, yc, w, h, valid)] (none when malformed)
+    """
+    boxes = []
+    bad = None
+    for n, line in enumerate(text.splitlines(), 1):
+        parts = line.split()
+        if not parts:
+            continue
+        if len(parts) != 5:
+            return "malformed", f"line {n}: expected 5 values, got {len(parts)}", []
+        try:
+            cls = int(parts[0])
+            xc, yc, w, h = (float(v) for v in parts[1:])
+        except ValueError:
+            return "malformed", f"line {n}: not a number", []
+        if cls < 0:
+            return "malformed", f"line {n}: negative class id", []
+
+        valid = (w > 0 and h > 0
+                 and xc - w / 2 >= -COORD_EPS and xc + w / 2 <= 1 + COORD_EPS
+                 and yc - h / 2 >= -COORD_EPS and yc + h / 2 <= 1 + COORD_EPS)
+        if not valid and bad is None:
+            bad = f"line {n}: box outside [0, 1]"
+        boxes.append((cls, xc, yc, w, h, valid))
+
+    if bad:
+        return "out_of_range", bad, boxes
+    return ("ok" if boxes else "empty"), None, boxes
+
+
+class DatasetIndex:
+    def __init__(self, img_dir=IMG_DIR, label_dir=LABEL_DIR, db_path=DATASET_DB):
+        self.img_dir = img_dir
+        self.label_dir = label_dir
+        self.db_path = db_path
+        self._refresh_lock = threading.Lock()
+
+    def _db(self):
+        return connect(self.db_path, _SCHEMA)
+
+    @staticmethod
+    def _listing(folder, exts):
+        """{name: (size, mtime_ns)} for matching files in folder."""
+        out = {}
+        if not os.path.isdir(folder):
+            return out
+        with os.scandir(folder) as it:
+            for e in it:
+                if e.is_file() and e.name.lower().endswith(exts):
+                    st = e.stat()
+                    out[e.name] = (st.st_size, st.st_mtime_ns)
+        return out
+
+    # ---------- incremental refresh ----------
+    def refresh(self):
+        """Bring the index in line with the folders. Returns counts of changed rows."""
+        with self._refresh_lock:
+            db = self._db()
+            return {"images": self._refresh_images(db), "labels": self._refresh_labels(db)}
+
+    def refresh_labels(self):
+        """Label-only refresh (no image decoding/hashing). Returns changed rows."""
+        with self._refresh_lock:
+            return self._refresh_labels(self._db())
+
+    def _refresh_images(self, db):
+        on_disk = self._listing(self.img_dir, IMG_EXTS)
+        known = {r["name"]: (r["size"], r["mtime"])
+                 for r in db.execute("SELECT name, size, mtime FROM images")}
+        gone = [(n,) for n in known.keys() - on_disk.keys()]
+        changed = [n for n, sig in on_disk.items() if known.get(n) != sig]
+
+        rows = []
+        for name in changed:
+            path = os.path.join(self.img_dir, name)
+            try:
+                with Image.open(path) as im:
+                    w, h = im.size
+            except Exception:
+                w = h = None
+            digest = blob_store.lookup(self.img_dir, name)
+            if digest is None:
+                try:
+                    digest = blob_store.hash_file(path)
+                except OSError:
+                    continue
+            size, mtime = on_disk[name]
+            rows.append((name, os.path.splitext(name)[0], w, h, digest, size, mtime))
+
+        with db:
+            db.executemany("DELETE FROM images WHERE name=?", gone)
+            db.executemany("INSERT OR REPLACE INTO images(name, stem, w, h, hash, size, mtime) "
+                           "VALUES (?,?,?,?,?,?,?)", rows)
+        return len(gone) + len(rows)
+
+    def _refresh_labels(self, db):
+        on_disk = {os.path.splitext(n)[0]: sig for n, sig in self._listing(self.label_dir, (".txt",)).items()}
+        known = {r["stem"]: (r["size"], r["mtime"])
+                 for r in db.execute("SELECT stem, size, mtime FROM labels")}
+        gone = [(s,) for s in known.keys() - on_disk.keys()]
+        changed = [s for s, sig in on_disk.items() if known.get(s) != sig]
+
+        with db:
+            db.executemany("DELETE FROM labels WHERE stem=?", gone)
+            db.executemany("DELETE FROM boxes WHERE stem=?", gone)
+            for stem in changed:
+                try:
+                    with open(os.path.join(self.label_dir, stem + ".txt"), "r", encoding="utf-8") as f:
+                        status, error, boxes = parse_label(f.read())
+                except (OSError, UnicodeDecodeError) as e:
+                    status, error, boxes = "malformed", str(e), []
+                size, mtime = on_disk[stem]
+                db.execute("INSERT OR REPLACE INTO labels(stem, size, mtime, status, error, nboxes) "
+                           "VALUES (?,?,?,?,?,?)", (stem, size, mtime, status, error, len(boxes)))
+                db.execute("DELETE FROM boxes WHERE stem=?", (stem,))
+                db.executemany(
+                    "INSERT INTO boxes(stem, idx, cls, xc, yc, w, h, area, valid) VALUES (?,?,?,?,?,?,?,?,?)",
+                    [(stem, i, c, xc, yc, w, h, w * h, int(v)) for i, (c, xc, yc, w, h, v) in enumerate(boxes)])
+        return len(gone) + len(changed)
+
+    # ---------- queries ----------
+    def validate(self, limit=100):
+        """
+        Problems found in the index. Each list is capped at `limit` entries;
+        "counts" always has the full totals.
+        """
+        db = self._db()
+
+        def listing(sql, count_sql, fmt):
+            total = db.execute(count_sql).fetchone()[0]
+            return total, [fmt(r) for r in db.execute(sql + " LIMIT ?", (limit,))]
+
+        checks = {
+            "missing_labels": listing(
+                "SELECT name FROM images WHERE stem NOT IN (SELECT stem FROM labels) ORDER BY name",
+                "SELECT COUNT(*) FROM images WHERE stem NOT IN (SELECT stem FROM labels)",
+                lambda r: r["name"]),
+            "extra_labels": listing(
+                "SELECT stem FROM labels WHERE stem NOT IN (SELECT stem FROM images) ORDER BY stem",
+                "SELECT COUNT(*) FROM labels WHERE stem NOT IN (SELECT stem FROM images)",
+                lambda r: r["stem"] + ".txt"),
+            "malformed": listing(
+                "SELECT stem, error FROM labels WHERE status='malformed' ORDER BY stem",
+                "SELECT COUNT(*) FROM labels WHERE status='malformed'",
+                lambda r: {"label": r["stem"] + ".txt", "error": r["error"]}),
+            "out_of_range": listing(
+                "SELECT stem, error FROM labels WHERE status='out_of_range' ORDER BY stem",
+                "SELECT COUNT(*) FROM labels WHERE status='out_of_range'",
+                lambda r: {"label": r["stem"] + ".txt", "error": r["error"]}),
+            "unreadable_images": listing(
+                "SELECT name FROM images WHERE w IS NULL ORDER BY name",
+                "SELECT COUNT(*) FROM images WHERE w IS NULL",
+                lambda r: r["name"]),
+        }
+        result = {k: items for k, (_, items) in checks.items()}
+        result["counts"] = {k: total for k, (total, _) in checks.items()}
+        result["ok"] = not any(result["counts"].values())
+        return result
+
+    def median_area(self):
+        """Median normalized box area over all valid boxes (None if there are none)."""
+        db = self._db()
+        n = db.execute("SELECT COUNT(*) FROM boxes WHERE valid=1").fetchone()[0]
+        if n == 0:
+            return None
+        rows = db.execute("SELECT area FROM boxes WHERE valid=1 ORDER BY area LIMIT ? OFFSET ?",
+                          (2 - n % 2, (n - 1) // 2)).fetchall()
+        return sum(r["area"] for r in rows) / len(rows)
+
+    def iter_box_areas(self):
+        """Normalized area of every valid box, streamed in insertion order."""
+        for r in self._db().execute("SELECT area FROM boxes WHERE valid=1 ORDER BY rowid"):
+            yield r["area"]
+
+    def stats(self):
+        db = self._db()
+        images = db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+        labels = db.execute("SELECT COUNT(*) FROM labels").fetchone()[0]
+        boxes = db.execute("SELECT COUNT(*) FROM boxes WHERE valid=1").fetchone()[0]
+        per_class = {str(r["cls"]): r["n"] for r in db.execute(
+            "SELECT cls, COUNT(*) AS n FROM boxes WHERE valid=1 GROUP BY cls ORDER BY cls")}
+        by_status = {r["status"]: r["n"] for r in db.execute(
+            "SELECT status, COUNT(*) AS n FROM labels GROUP BY status")}
+        return {
+            "images": images,
+            "labels": labels,
+            "boxes": boxes,
+            "median_area": self.median_area(),
+            "per_class": per_class,
+            "label_status": by_status,
+        }
+
+
+dataset_index = DatasetIndex()
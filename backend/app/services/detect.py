@@ -1,68 +1,94 @@
 import os
 import json
+import time
 import cv2
 import numpy as np
-from ultralytics import YOLO
+from functools import lru_cache
+from app.services.model_registry import ModelRegistry
+from app.services import model_versions, model_backends
 
 # =====================================================================
 # CONFIG
 # =====================================================================
-MODEL_PATH = "app/model/best.pt"        # user-trained custom model
 DEFAULT_MODEL_WEIGHTS = "yolov8m.pt"    # pretrained COCO model
 REF_AREA_PATH = "data/user_object/reference_area.json"
 
 DEFAULT_REF_AREA = 0.05
 VISIBILITY_THRESHOLD = 0.30             # 30% visibility rule
+INFER_IMGSZ = 640                       # shared letterbox size for both models
 
 # =====================================================================
-# LOAD MODELS (custom + default)
+# MODELS (custom + default) — registered here, loaded on first use
+# (or by warm_models() on startup), kept in the registry
 # =====================================================================
-print("\n=================== MODEL LOADING ===================")
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "0") == "1"
 
-custom_model = None
-default_model = None
+registry = ModelRegistry()
+registry.register("custom", model_versions.current_path("custom"),
+                  backend=model_backends.backend_for("custom"),
+                  variant=model_backends.variant_for("custom"),
+                  follow=lambda: model_versions.current_path("custom"),
+                  required=False)      # absent until the first training
+registry.register("default", DEFAULT_MODEL_WEIGHTS, download=True,
+                  backend=model_backends.backend_for("default"),
+                  variant=model_backends.variant_for("default"))
 
-# -------- Load custom model (if exists) --------
-if os.path.exists(MODEL_PATH):
-    try:
-        custom_model = YOLO(MODEL_PATH)
-        print("✔ Loaded CUSTOM model:", MODEL_PATH)
-    except Exception as e:
-        print("❌ Failed loading custom model:", e)
-else:
-    print("⚠ Custom model not found:", MODEL_PATH)
-
-# -------- Load default pretrained model --------
-try:
-    default_model = YOLO(DEFAULT_MODEL_WEIGHTS)
-    print("✔ Loaded DEFAULT model:", DEFAULT_MODEL_WEIGHTS)
-except Exception as e:
-    print("❌ Failed loading default YOLO model:", e)
 
-print("====================================================\n")
+def warm_models(background=True):
+    """Load every model and run one dummy inference, by default off-thread."""
+    if background:
+        return registry.start_warmup(INFER_IMGSZ)
+    registry.warmup_all(INFER_IMGSZ)
 
 
 def reload_model():
-    """Reload custom model after training."""
-    global custom_model
-    if os.path.exists(MODEL_PATH):
-        custom_model = YOLO(MODEL_PATH)
-        print("✔ Custom model reloaded")
-        return True
+    """
+    Hot-swap the custom model to the current version (after training).
+    The new weights are loaded and warmed while the old model keeps serving;
+    in-flight batches finish on the version they started with. Other
+    processes (process-pool workers) follow current.json on their own.
+    """
+    path = model_versions.current_path("custom")
+    if path and os.path.exists(path):
+        return registry.swap("custom", path, imgsz=INFER_IMGSZ)
     return False
 
 
 # =====================================================================
-# LOAD REFERENCE AREA (median normalized area)
+# REFERENCE AREA (median normalized area) — hot-reloaded when the file
+# changes (labels written anywhere update it online, see reference_area.py)
 # =====================================================================
-if os.path.exists(REF_AREA_PATH):
+REF_AREA_CHECK_S = float(os.environ.get("REF_AREA_CHECK_S", 2.0))
+
+REF_AREA = DEFAULT_REF_AREA
+_ref_area_mtime = None
+_ref_area_checked = 0.0
+
+
+def current_ref_area():
+    """REF_AREA, re-read from REF_AREA_PATH when its mtime moved (checked at most every REF_AREA_CHECK_S)."""
+    global REF_AREA, _ref_area_mtime, _ref_area_checked
+    now = time.monotonic()
+    if _ref_area_mtime is not None and now - _ref_area_checked < REF_AREA_CHECK_S:
+        return REF_AREA
+    _ref_area_checked = now
     try:
-        with open(REF_AREA_PATH, "r") as f:
-            REF_AREA = json.load(f)["reference_area_norm"]
-    except:
+        mtime = os.stat(REF_AREA_PATH).st_mtime_ns
+    except OSError:
+        _ref_area_mtime = 0
         REF_AREA = DEFAULT_REF_AREA
-else:
-    REF_AREA = DEFAULT_REF_AREA
+        return REF_AREA
+    if mtime != _ref_area_mtime:
+        _ref_area_mtime = mtime
+        try:
+            with open(REF_AREA_PATH, "r") as f:
+                REF_AREA = json.load(f)["reference_area_norm"]
+        except:
+            REF_AREA = DEFAULT_REF_AREA
+    return REF_AREA
+
+
+current_ref_area()
 
 
 # =====================================================================
@@ -70,6 +96,12 @@ else:
 # =====================================================================
 def compute_3x3_regions(W, H):
     """Return list of 9 regions inside a 9×9 grid."""
+    return [tuple(int(v) for v in r) for r in _regions_array(W, H)]
+
+
+@lru_cache(maxsize=64)
+def _regions_array(W, H):
+    """(9, 4) int array of compute_3x3_regions(W, H), cached per frame size."""
     cell_w = W / 9
     cell_h = H / 9
 
@@ -82,158 +114,306 @@ def compute_3x3_regions(W, H):
             y2 = int((r + 3) * cell_h)
             regions.append((x1, y1, x2, y2))
 
-    return regions
-
-
-def intersection_area(b, r):
-    xa = max(b[0], r[0])
-    ya = max(b[1], r[1])
-    xb = min(b[2], r[2])
-    yb = min(b[3], r[3])
-    return max(0, xb - xa) * max(0, yb - ya)
+    arr = np.array(regions, dtype=np.int64)
+    arr.setflags(write=False)
+    return arr
 
 
 # =====================================================================
-# PROCESS YOLO RESULTS
+# DECODE + PREPROCESS (shared by both models)
 # =====================================================================
-def extract_boxes(result):
-    """Convert YOLO result into list of dict boxes."""
-    out = []
-    if result is None:
-        return out
-    if len(result.boxes) == 0:
-        return out
+def load_image(src):
+    """Accept a file path, encoded image bytes or a decoded BGR array; return BGR array or None."""
+    if isinstance(src, np.ndarray):
+        return src
+    if isinstance(src, (bytes, bytearray, memoryview)):
+        return decode_image_bytes(src)
+    return cv2.imread(src)
 
-    names = result.names
 
-    for b in result.boxes:
-        xyxy = b.xyxy[0].cpu().numpy().astype(int).tolist()
-        conf = float(b.conf[0])
-        cls_id = int(b.cls[0])
+def decode_image_bytes(data):
+    """Decode encoded image bytes (jpg/png...) straight from memory; None if invalid."""
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    if buf.size == 0:
+        return None
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
 
-        out.append({
-            "xyxy": xyxy,
-            "conf": conf,
-            "cls": cls_id,
-            "name": names.get(cls_id, "object")
-        })
 
-    return out
+def letterbox(img, size=INFER_IMGSZ, color=(114, 114, 114)):
+    """
+    Resize keeping aspect ratio and pad to a size×size square.
+    Returns (padded_img, ratio, (pad_left, pad_top)) so boxes can be mapped back.
+    """
+    h, w = img.shape[:2]
+    r = min(size / h, size / w)
+    nw, nh = int(round(w * r)), int(round(h * r))
+    if (nw, nh) != (w, h):
+        img = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+
+    pad_w = (size - nw) / 2
+    pad_h = (size - nh) / 2
+    top, bottom = int(round(pad_h - 0.1)), int(round(pad_h + 0.1))
+    left, right = int(round(pad_w - 0.1)), int(round(pad_w + 0.1))
+    img = cv2.copyMakeBorder(img, top, bottom, left, right,
+                             cv2.BORDER_CONSTANT, value=color)
+    return img, r, (left, top)
+
+
+def preprocess_batch(images, size=INFER_IMGSZ):
+    """
+    Letterbox + normalize N decoded BGR images into ONE float tensor (N,3,size,size)
+    in [0,1] RGB. Returns (tensor, metas) where metas[i] = (ratio, pad, (W, H)).
+    """
+    import torch
+
+    padded = []
+    metas = []
+    for img in images:
+        lb, ratio, pad = letterbox(img, size)
+        padded.append(lb)
+        metas.append((ratio, pad, (img.shape[1], img.shape[0])))
+
+    batch = np.stack(padded)[..., ::-1].transpose(0, 3, 1, 2)   # BGR→RGB, BHWC→BCHW
+    batch = np.ascontiguousarray(batch)
+    tensor = torch.from_numpy(batch).float().div_(255.0)
+    return tensor, metas
 
 
 # =====================================================================
-# MAIN DETECT FUNCTION (MERGED MODELS)
+# PROCESS YOLO RESULTS
 # =====================================================================
-def detect_object(image_path, conf_thresh=0.25, iou_thresh=0.45):
+# One row per detection; `src` indexes the class-name maps returned by
+# run_models(), `prio` marks classes the custom model knows (picked first).
+DET_DTYPE = np.dtype([
+    ("x1", np.int64), ("y1", np.int64), ("x2", np.int64), ("y2", np.int64),
+    ("conf", np.float32),
+    ("cls", np.int64),
+    ("src", np.uint8),
+    ("prio", np.bool_),
+])
+SRC_CUSTOM, SRC_DEFAULT = 0, 1
+
+
+def extract_boxes(result, meta=None, src=SRC_CUSTOM, prio_ids=()):
     """
-    Runs detection using:
-       ✔ your custom model  (best.pt)
-       ✔ pretrained COCO model (yolov8m.pt)
-    Merges detections and returns BEST object.
+    Convert YOLO result into a DET_DTYPE structured array (one host copy of
+    boxes.data, no per-box Python work).
+    If meta (ratio, pad, (W, H)) is given, boxes are mapped from the letterboxed
+    tensor back to original image pixels.
+    prio_ids: class ids of this model whose names the custom model also has.
     """
+    if result is None or len(result.boxes) == 0:
+        return np.empty(0, dtype=DET_DTYPE)
+
+    data = result.boxes.data.cpu().numpy()      # (N, 6): x1 y1 x2 y2 conf cls
+    xyxy = data[:, :4]
+    if meta is not None:
+        ratio, (pad_x, pad_y), (W, H) = meta
+        xyxy = (xyxy - np.array([pad_x, pad_y, pad_x, pad_y])) / ratio
+        xyxy = np.clip(xyxy, 0, [W, H, W, H])
+    xyxy = xyxy.astype(int)
+
+    out = np.empty(len(data), dtype=DET_DTYPE)
+    out["x1"], out["y1"], out["x2"], out["y2"] = xyxy.T
+    out["conf"] = data[:, 4]
+    out["cls"] = data[:, 5].astype(int)
+    out["src"] = src
+    out["prio"] = np.isin(out["cls"], prio_ids)
+    return out
 
-    img = cv2.imread(image_path)
-    if img is None:
-        return {"detected": False, "error": "cannot_read_image"}
-
-    H, W = img.shape[:2]
 
-    all_dets = []
+def _priority_ids(class_map, custom_names):
+    """Class ids of a model whose names belong to the custom model."""
+    return np.array([i for i, n in class_map.items() if n in custom_names], dtype=np.int64)
 
-    # -------------------- CUSTOM MODEL --------------------
-    if custom_model:
-        try:
-            r = custom_model.predict(image_path, conf=conf_thresh, iou=iou_thresh)
-            all_dets += extract_boxes(r[0])
-        except Exception as e:
-            print("⚠ Custom model error:", e)
 
-    # -------------------- DEFAULT YOLO --------------------
-    if default_model:
-        try:
-            r2 = default_model.predict(image_path, conf=conf_thresh, iou=iou_thresh)
-            all_dets += extract_boxes(r2[0])
-        except Exception as e:
-            print("⚠ Default model error:", e)
+def summarize_detections(dets, W, H, class_maps):
+    """
+    Pick best detection (custom classes first) and build the API result dict.
+    dets: DET_DTYPE array (both models merged); class_maps: names per `src`.
+    """
 
     # -------------------- NO DETECTIONS --------------------
-    if len(all_dets) == 0:
+    if len(dets) == 0:
         return {"detected": False, "reason": "no_detections"}
 
     # -------------------- PICK BEST OBJECT --------------------
-    # If custom model has ANY detection → give priority
-    custom_names = set()
+    # Detections belonging to custom class → give priority (first max on ties)
+    prio = dets["prio"]
+    cand = np.flatnonzero(prio) if prio.any() else np.arange(len(dets))
+    best = dets[cand[np.argmax(dets["conf"][cand])]]
 
-    if custom_model:
-        try:
-            # Collect custom class names dynamically
-            tmp = YOLO(MODEL_PATH)
-            for n in tmp.names.values():
-                custom_names.add(n)
-        except:
-            pass
-
-    # Filter detections belonging to custom class
-    custom_hits = [d for d in all_dets if d["name"] in custom_names]
-
-    if len(custom_hits) > 0:
-        best = max(custom_hits, key=lambda x: x["conf"])
-    else:
-        best = max(all_dets, key=lambda x: x["conf"])
-
-    x1, y1, x2, y2 = best["xyxy"]
+    x1, y1, x2, y2 = (int(best[k]) for k in ("x1", "y1", "x2", "y2"))
 
     w = x2 - x1
     h = y2 - y1
     area_norm = (w / W) * (h / H)
-    visible = area_norm >= (REF_AREA * VISIBILITY_THRESHOLD)
+    ref_area = current_ref_area()
+    visible = area_norm >= (ref_area * VISIBILITY_THRESHOLD)
 
     # -------------------- REGION MAPPING --------------------
-    regions = compute_3x3_regions(W, H)
-    region_name = "unknown"
-    region_id = 0
-
-    box_area = max(1, w * h)
+    # overlap of the box with all 9 regions at once; first region holding ≥50%
+    regions = _regions_array(W, H)
+    iw = np.clip(np.minimum(x2, regions[:, 2]) - np.maximum(x1, regions[:, 0]), 0, None)
+    ih = np.clip(np.minimum(y2, regions[:, 3]) - np.maximum(y1, regions[:, 1]), 0, None)
+    hits = np.flatnonzero((iw * ih) / max(1, w * h) >= 0.50)
+
+    if len(hits):
+        region_id = int(hits[0]) + 1
+        region_name = f"place{region_id}"
+    else:
+        region_name = "unknown"
+        region_id = 0
 
-    for i, reg in enumerate(regions):
-        if intersection_area((x1, y1, x2, y2), reg) / box_area >= 0.50:
-            region_name = f"place{i+1}"
-            region_id = i + 1
-            break
+    cls_id = int(best["cls"])
+    names = class_maps[int(best["src"])] if int(best["src"]) < len(class_maps) else {}
 
     # -------------------- RETURN RESULT --------------------
     return {
         "detected": True,
-        "class_name": best["name"],
+        "class_name": names.get(cls_id, "object"),
         "bbox_px": [x1, y1, x2, y2],
-        "conf": best["conf"],
+        "conf": float(best["conf"]),
         "visible_30_percent": visible,
         "area_norm": area_norm,
-        "reference_area": REF_AREA,
+        "reference_area": ref_area,
         "region": region_name,
         "region_id": region_id,
-        "region_boxes": regions,
+        "region_boxes": compute_3x3_regions(W, H),
         "grid_type": "9x9 → 3x3 mapping"
     }
 
 
 # =====================================================================
-# STREAM DETECTION
+# MAIN DETECT FUNCTIONS (MERGED MODELS)
 # =====================================================================
-def detect_from_stream(url, conf=0.25, imgsz=640):
-    cap = cv2.VideoCapture(url)
+def run_models(decoded, conf_thresh=0.25, iou_thresh=0.45, imgsz=INFER_IMGSZ):
+    """
+    Forward pass only: both models on one shared letterboxed tensor.
+    Returns (per_image_dets, metas, class_maps) for summarize_detections():
+    per_image_dets[k] is a DET_DTYPE array with both models' boxes merged.
+    """
+    # Lease registry entries once so the whole batch uses one consistent model set,
+    # even if a hot swap flips the registry mid-batch
+    with registry.lease("custom") as custom, registry.lease("default") as default:
+        return _run_entries(custom, default, decoded, conf_thresh, iou_thresh, imgsz)
+
+
+def _run_entries(custom, default, decoded, conf_thresh, iou_thresh, imgsz):
+    tensor, metas = preprocess_batch(decoded, imgsz)
+    parts = [[] for _ in decoded]
+
+    # If custom model has ANY detection → give priority (names cached in registry)
+    custom_names = custom["names"] if custom else frozenset()
+    class_maps = (custom["class_map"] if custom else {},
+                  default["class_map"] if default else {})
+
+    # -------------------- CUSTOM MODEL --------------------
+    if custom:
+        try:
+            with registry.instance(custom) as model:
+                r = model.predict(tensor, conf=conf_thresh, iou=iou_thresh, verbose=False)
+            ids = _priority_ids(custom["class_map"], custom_names)
+            for k, res in enumerate(r):
+                parts[k].append(extract_boxes(res, metas[k], SRC_CUSTOM, ids))
+        except Exception as e:
+            print("⚠ Custom model error:", e)
 
-    if not cap.isOpened():
-        return {"error": "cannot_open_stream"}
+    # -------------------- DEFAULT YOLO --------------------
+    if default:
+        try:
+            with registry.instance(default) as model:
+                r2 = model.predict(tensor, conf=conf_thresh, iou=iou_thresh, verbose=False)
+            ids = _priority_ids(default["class_map"], custom_names)
+            for k, res in enumerate(r2):
+                parts[k].append(extract_boxes(res, metas[k], SRC_DEFAULT, ids))
+        except Exception as e:
+            print("⚠ Default model error:", e)
+
+    per_image = [np.concatenate(p) if p else np.empty(0, dtype=DET_DTYPE) for p in parts]
+    return per_image, metas, class_maps
 
-    ok, frame = cap.read()
-    cap.release()
 
-    if not ok or frame is None:
-        return {"error": "cannot_read_frame"}
+def detect_batch(images, conf_thresh=0.25, iou_thresh=0.45, imgsz=INFER_IMGSZ):
+    """
+    Batched detection for N images (file paths, encoded bytes or BGR arrays) → N results.
+    Each image is decoded once and letterboxed once into a shared tensor;
+    both models run on that same tensor in a single forward pass each.
+    """
+    results = [None] * len(images)
+    decoded = []
+    slots = []
 
-    os.makedirs("data/stream_cache", exist_ok=True)
-    temp = "data/stream_cache/frame.jpg"
-    cv2.imwrite(temp, frame)
+    for i, src in enumerate(images):
+        img = load_image(src)
+        if img is None:
+            results[i] = {"detected": False, "error": "cannot_read_image"}
+        else:
+            decoded.append(img)
+            slots.append(i)
 
-    return detect_object(temp, conf_thresh=conf)
+    if not decoded:
+        return results
+
+    per_image, metas, class_maps = run_models(decoded, conf_thresh, iou_thresh, imgsz)
+
+    for k, i in enumerate(slots):
+        W, H = metas[k][2]
+        results[i] = summarize_detections(per_image[k], W, H, class_maps)
+
+    return results
+
+
+def detect_object(image, conf_thresh=0.25, iou_thresh=0.45):
+    """
+    Runs detection using:
+       ✔ your custom model  (best.pt)
+       ✔ pretrained COCO model (yolov8m.pt)
+    Merges detections and returns BEST object.
+    `image` may be a file path, encoded image bytes or a decoded BGR array.
+    """
+    return detect_batch([image], conf_thresh, iou_thresh)[0]
+
+
+# =====================================================================
+# STREAM DETECTION
+# =====================================================================
+def detect_stream_live(stream_url, conf=0.25, imgsz=640, frame_skip=0, max_fps=None,
+                       show_window=False, stats_every=5.0):
+    """
+    Continuous detection on a stream (blocking, Ctrl+C or 'q' to stop).
+    Capture and inference run on separate threads with a drop-oldest queue,
+    so capture never falls behind; returns final per-stage latency stats.
+    """
+    from app.services.live_engine import LiveDetector
+
+    engine = LiveDetector(stream_url, conf=conf, imgsz=imgsz, frame_skip=frame_skip,
+                          max_fps=max_fps, keep_annotated=show_window)
+    engine.start()
+    print("✔ Live detection started:", stream_url)
+
+    last_print = time.monotonic()
+    try:
+        while engine.running:
+            if show_window:
+                frame = engine.latest_annotated()
+                if frame is not None:
+                    cv2.imshow("Live Detection", frame)
+                if (cv2.waitKey(1) & 0xFF) == ord("q"):
+                    break
+            else:
+                time.sleep(0.2)
+
+            if stats_every and time.monotonic() - last_print >= stats_every:
+                print("LIVE_STATS:", json.dumps(engine.stats()))
+                last_print = time.monotonic()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+        if show_window:
+            cv2.destroyAllWindows()
+
+    final = engine.stats()
+    print("LIVE_STATS (final):", json.dumps(final))
+    return final
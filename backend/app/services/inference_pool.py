@@ -0,0 +1,131 @@
+# backend/app/services/inference_pool.py
+import os
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# =====================================================================
+# CONFIG (override with env vars)
+# =====================================================================
+POOL_KIND = os.environ.get("INFERENCE_POOL_KIND", "thread")          # thread | process
+POOL_WORKERS = int(os.environ.get("INFERENCE_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+QUEUE_SIZE = int(os.environ.get("INFERENCE_QUEUE_SIZE", 16))         # waiting jobs allowed
+REQUEST_TIMEOUT = float(os.environ.get("INFERENCE_TIMEOUT", 30))     # seconds per request
+
+
+class PoolFull(Exception):
+    """Raised when all workers are busy AND the waiting queue is full."""
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# running + waiting jobs never exceed POOL_WORKERS + QUEUE_SIZE
+_slots = threading.BoundedSemaphore(POOL_WORKERS + QUEUE_SIZE)
+_stats = {"submitted": 0, "rejected": 0, "timeouts": 0, "in_flight": 0}
+_stats_lock = threading.Lock()
+
+
+def get_executor():
+    """Create the worker pool on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            if POOL_KIND == "process":
+                # spawn: never fork a process that already holds torch threads
+                ctx = multiprocessing.get_context("spawn")
+                _executor = ProcessPoolExecutor(max_workers=POOL_WORKERS, mp_context=ctx)
+            else:
+                _executor = ThreadPoolExecutor(max_workers=POOL_WORKERS,
+                                               thread_name_prefix="inference")
+            print(f"✔ Inference pool started: {POOL_KIND} x{POOL_WORKERS} (queue {QUEUE_SIZE})")
+        return _executor
+
+
+def _release(_fut):
+    _slots.release()
+    with _stats_lock:
+        _stats["in_flight"] -= 1
+
+
+def _admit():
+    """Take one queue slot or raise PoolFull."""
+    if not _slots.acquire(blocking=False):
+        with _stats_lock:
+            _stats["rejected"] += 1
+        raise PoolFull()
+
+    with _stats_lock:
+        _stats["submitted"] += 1
+        _stats["in_flight"] += 1
+
+
+def submit(fn, *args, **kwargs):
+    """
+    Submit fn(*args, **kwargs) to the pool WITHOUT blocking.
+    Returns a concurrent.futures.Future, raises PoolFull when saturated.
+    For the process pool, fn and its arguments must be picklable.
+    """
+    _admit()
+    try:
+        fut = get_executor().submit(fn, *args, **kwargs)
+    except Exception:
+        _release(None)
+        raise
+    fut.add_done_callback(_release)
+    return fut
+
+
+def submit_batched(batcher, image, *params):
+    """Same admission control as submit(), but the job joins a MicroBatcher batch."""
+    _admit()
+    try:
+        fut = batcher.submit(image, *params)
+    except Exception:
+        _release(None)
+        raise
+    fut.add_done_callback(_release)
+    return fut
+
+
+async def _wait(fut, timeout):
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(fut),
+                                      timeout or REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        fut.cancel()   # drops it if still waiting in the queue
+        with _stats_lock:
+            _stats["timeouts"] += 1
+        raise
+
+
+async def run(fn, *args, timeout=None, **kwargs):
+    """
+    Await fn(*args) on the pool from the event loop.
+    Raises PoolFull (queue full) or asyncio.TimeoutError (took longer than timeout).
+    """
+    return await _wait(submit(fn, *args, **kwargs), timeout)
+
+
+async def run_batched(batcher, image, *params, timeout=None):
+    """Await one image's result from a MicroBatcher; same errors as run()."""
+    return await _wait(submit_batched(batcher, image, *params), timeout)
+
+
+def stats():
+    with _stats_lock:
+        return {
+            "kind": POOL_KIND,
+            "workers": POOL_WORKERS,
+            "queue_size": QUEUE_SIZE,
+            **_stats
+        }
+
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
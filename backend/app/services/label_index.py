@@ -0,0 +1,131 @@
+# backend/app/services/label_index.py
+import os
+import uuid
+import threading
+from collections import deque
+
+# =====================================================================
+# In-process index of which images have a label file
+#
+#   built by one directory scan on first use, then kept current by the
+#   label writers (app.utils.label_io) instead of rescanning per request.
+#   Every change bumps `version` and lands in a bounded changelog, so
+#   pollers can ask for "changes since N" or revalidate with an ETag.
+# =====================================================================
+TRAIN_LABELS = "data/train_tmp/labels"
+MANUAL_LABELS = "data/user_object/labels"
+
+CHANGELOG_MAX = int(os.environ.get("LABEL_CHANGELOG_MAX", 10000))
+
+
+def _norm_dir(d):
+    return os.path.normpath(d).replace("\\", "/")
+
+
+class LabelIndex:
+    def __init__(self, dirs):
+        self._dirs = [_norm_dir(d) for d in dirs]
+        self._lock = threading.Lock()
+        self._loaded = False
+        # stem -> set of dirs holding <stem>.txt
+        self._where = {}
+        self._version = 0
+        self._changes = deque(maxlen=CHANGELOG_MAX)  # (version, stem, present)
+        # new token per process → ETags from before a restart never match
+        self._epoch = uuid.uuid4().hex[:8]
+
+    # ---------- loading ----------
+    def _scan(self):
+        where = {}
+        for d in self._dirs:
+            if not os.path.isdir(d):
+                continue
+            with os.scandir(d) as it:
+                for e in it:
+                    if e.name.endswith(".txt"):
+                        where.setdefault(e.name.rsplit(".", 1)[0], set()).add(d)
+        return where
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self._where = self._scan()
+            self._loaded = True
+
+    def rescan(self):
+        """Resync with the disk (e.g. after files were edited outside the app)."""
+        where = self._scan()
+        with self._lock:
+            self._ensure_loaded()
+            for stem in set(self._where) | set(where):
+                self._set(stem, where.get(stem, set()))
+
+    # ---------- updates ----------
+    def _set(self, stem, dirs):
+        had = stem in self._where
+        if dirs:
+            self._where[stem] = dirs
+        else:
+            self._where.pop(stem, None)
+        if had != bool(dirs):
+            self._version += 1
+            self._changes.append((self._version, stem, bool(dirs)))
+
+    def notify(self, label_path):
+        """A label file was written or removed; re-check just that file."""
+        d = _norm_dir(os.path.dirname(label_path))
+        if d not in self._dirs:
+            return
+        stem = os.path.basename(label_path).rsplit(".", 1)[0]
+        present = os.path.exists(label_path)
+        with self._lock:
+            if not self._loaded:
+                return  # first scan will see it
+            dirs = set(self._where.get(stem, ()))
+            (dirs.add if present else dirs.discard)(d)
+            self._set(stem, dirs)
+
+    def notify_dir_cleared(self, folder):
+        """Every label in `folder` is gone (folder was wiped)."""
+        d = _norm_dir(folder)
+        with self._lock:
+            if not self._loaded:
+                return
+            for stem in [s for s, dirs in self._where.items() if d in dirs]:
+                self._set(stem, self._where[stem] - {d})
+
+    # ---------- queries ----------
+    @property
+    def etag(self):
+        with self._lock:
+            self._ensure_loaded()
+            return f'W/"{self._epoch}-{self._version}"'
+
+    def snapshot(self):
+        """(version, etag, {stem: True})"""
+        with self._lock:
+            self._ensure_loaded()
+            return (self._version, f'W/"{self._epoch}-{self._version}"',
+                    {stem: True for stem in self._where})
+
+    def changes_since(self, since):
+        """
+        (version, added, removed) since `since`, or None when the changelog
+        no longer reaches back that far (caller must take a full snapshot).
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if since > self._version:
+                return None
+            if since < self._version and (not self._changes or self._changes[0][0] > since + 1):
+                return None
+            final = {}
+            for v, stem, present in reversed(self._changes):
+                if v <= since:
+                    break
+                final.setdefault(stem, present)
+            added = sorted(s for s, p in final.items() if p)
+            removed = sorted(s for s, p in final.items() if not p)
+            return self._version, added, removed
+
+
+label_index = LabelIndex([TRAIN_LABELS, MANUAL_LABELS])
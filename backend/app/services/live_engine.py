@@ -0,0 +1,257 @@
+# backend/app/services/live_engine.py
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+
+from app.services import inference_pool
+from app.services.detect import detect_batch
+from app.services.stream_manager import stream_manager
+from app.services.camera_hub import camera_hub
+
+FRAME_WAIT_S = 0.5          # max wait for a new frame before re-checking stop/reader
+STATS_WINDOW = 200          # samples kept per stage for latency percentiles
+
+
+class StageTimer:
+    """Rolling latency window (ms) for one pipeline stage."""
+
+    def __init__(self, window=STATS_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds * 1000.0)
+
+    def summary(self):
+        with self._lock:
+            if not self._samples:
+                return {"avg": None, "p50": None, "p95": None, "max": None}
+            arr = np.fromiter(self._samples, dtype=float)
+        return {
+            "avg": round(float(arr.mean()), 2),
+            "p50": round(float(np.percentile(arr, 50)), 2),
+            "p95": round(float(np.percentile(arr, 95)), 2),
+            "max": round(float(arr.max()), 2),
+        }
+
+
+def draw_result(frame, result):
+    """Overlay bbox + region on a copy of the frame."""
+    out = frame.copy()
+    if result and result.get("detected"):
+        x1, y1, x2, y2 = result["bbox_px"]
+        cv2.rectangle(out, (x1, y1), (x2, y2), (0, 255, 0), 2)
+        label = f'{result["class_name"]} {result["conf"]:.2f} {result["region"]}'
+        cv2.putText(out, label, (x1 + 5, max(15, y1 - 5)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 0), 2)
+    return out
+
+
+class LiveDetector:
+    """
+    Continuous detection engine:
+
+        stream reader ──► capture thread ──► drop-oldest queue ──► inference thread ──► on_result()
+
+    - frames come from the shared stream_manager reader of the URL (one camera
+      connection no matter how many detectors, SSE clients or hub entries use it);
+      the capture thread takes every new frame_id it publishes
+    - the queue holds at most `queue_size` frames; when full the OLDEST is dropped,
+      so inference always works on recent frames and capture never blocks
+    - `frame_skip=N` runs detection on 1 of every N+1 dequeued frames
+    - `max_fps` caps detections per second
+    - detection runs on the shared inference pool (same admission control as
+      requests; a full pool skips the frame); when the URL is also a CameraHub
+      camera, the hub's result for that frame is reused instead of a second pass
+    """
+
+    def __init__(self, stream_url, conf=0.25, imgsz=640, frame_skip=0, max_fps=None,
+                 queue_size=2, on_result=None, keep_annotated=False):
+        self.stream_url = stream_url
+        self.conf = conf
+        self.imgsz = imgsz
+        self.frame_skip = max(0, int(frame_skip or 0))
+        self.min_interval = (1.0 / max_fps) if max_fps else 0.0
+        self.on_result = on_result
+        self.keep_annotated = keep_annotated
+
+        self._queue = deque(maxlen=max(1, queue_size))
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+
+        self._latest_result = None
+        self._latest_annotated = None
+        self._result_lock = threading.Lock()
+
+        self.capture_ms = StageTimer()
+        self.inference_ms = StageTimer()
+        self.postprocess_ms = StageTimer()
+        self.counters = {"captured": 0, "dropped": 0, "skipped": 0, "processed": 0,
+                         "rejected": 0, "shared": 0}
+        self.error = None
+        self._started_at = None
+
+    # ------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------
+    @property
+    def running(self):
+        return not self._stop.is_set()
+
+    def start(self):
+        self._started_at = time.monotonic()
+        for target, name in ((self._capture_loop, "live-capture"),
+                             (self._inference_loop, "live-inference")):
+            t = threading.Thread(target=target, daemon=True, name=name)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self, join_timeout=2.0):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        for t in self._threads:
+            t.join(join_timeout)
+
+    # ------------------------------------------------------------
+    # Capture thread
+    # ------------------------------------------------------------
+    def _capture_loop(self):
+        # held for the engine's lifetime: never reaped under us, and our leaving
+        # does not stop the reader for other consumers of the URL
+        reader = stream_manager.acquire(self.stream_url)
+        try:
+            self._consume(reader)
+        finally:
+            stream_manager.release(self.stream_url)
+
+    def _consume(self, reader):
+        last_id = 0
+        while not self._stop.is_set():
+            if reader.stopped:
+                # re-attach: the reader was stopped explicitly (stream_manager.stop)
+                reader = stream_manager.get(self.stream_url)
+                last_id = 0
+
+            t0 = time.perf_counter()
+            frame, frame_id, _ = reader.wait_frame(last_id, FRAME_WAIT_S)
+            if frame is None or frame_id == last_id:
+                if reader.error:
+                    self.error = reader.error
+                continue
+            self.capture_ms.add(time.perf_counter() - t0)
+            last_id = frame_id
+            self.error = None
+
+            with self._cond:
+                if len(self._queue) == self._queue.maxlen:
+                    self.counters["dropped"] += 1      # deque drops the oldest
+                self._queue.append((frame_id, frame))
+                self.counters["captured"] += 1
+                self._cond.notify()
+
+    # ------------------------------------------------------------
+    # Inference thread
+    # ------------------------------------------------------------
+    def _next_frame(self):
+        with self._cond:
+            while not self._queue and not self._stop.is_set():
+                self._cond.wait(0.5)
+            if self._stop.is_set():
+                return None
+            return self._queue.popleft()
+
+    def _inference_loop(self):
+        seen = 0
+        last_run = 0.0
+
+        while not self._stop.is_set():
+            item = self._next_frame()
+            if item is None:
+                break
+            frame_id, frame = item
+
+            seen += 1
+            if self.frame_skip and (seen - 1) % (self.frame_skip + 1) != 0:
+                self.counters["skipped"] += 1
+                continue
+
+            # FPS cap: wait out the rest of the interval, then use the freshest frame
+            wait = self.min_interval - (time.monotonic() - last_run)
+            if wait > 0:
+                self._stop.wait(wait)
+                with self._cond:
+                    if self._queue:
+                        frame_id, frame = self._queue.pop()
+                        self.counters["skipped"] += len(self._queue) + 1
+                        self._queue.clear()
+            last_run = time.monotonic()
+
+            t0 = time.perf_counter()
+            result = self._detect(frame_id, frame)
+            if result is None:
+                continue
+            t1 = time.perf_counter()
+            annotated = draw_result(frame, result) if self.keep_annotated else None
+            t2 = time.perf_counter()
+
+            self.inference_ms.add(t1 - t0)
+            self.postprocess_ms.add(t2 - t1)
+            self.counters["processed"] += 1
+
+            with self._result_lock:
+                self._latest_result = result
+                self._latest_annotated = annotated
+
+            if self.on_result:
+                try:
+                    self.on_result(result)
+                except Exception as e:
+                    print("⚠ Live on_result callback error:", e)
+
+    def _detect(self, frame_id, frame):
+        """Result for one frame (None = skipped): the hub's if it runs this URL, else a pool job."""
+        shared, result = camera_hub.wait_result(self.stream_url, frame_id, self.conf, self.imgsz,
+                                                inference_pool.REQUEST_TIMEOUT)
+        if shared:
+            if result is not None:
+                self.counters["shared"] += 1
+            return result
+        try:
+            fut = inference_pool.submit(detect_batch, [frame], self.conf, 0.45, self.imgsz)
+        except inference_pool.PoolFull:
+            self.counters["rejected"] += 1
+            return None
+        try:
+            return fut.result(timeout=inference_pool.REQUEST_TIMEOUT)[0]
+        except Exception as e:
+            fut.cancel()
+            print("⚠ Live inference error:", e)
+            return None
+
+    # ------------------------------------------------------------
+    # Readers
+    # ------------------------------------------------------------
+    def latest_result(self):
+        with self._result_lock:
+            return self._latest_result
+
+    def latest_annotated(self):
+        with self._result_lock:
+            return self._latest_annotated
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        return {
+            **self.counters,
+            "error": self.error,
+            "fps": round(self.counters["processed"] / elapsed, 2) if elapsed else 0.0,
+            "capture_ms": self.capture_ms.summary(),
+            "inference_ms": self.inference_ms.summary(),
+            "postprocess_ms": self.postprocess_ms.summary(),
+        }
@@ -0,0 +1,125 @@
+# backend/app/services/live_hub.py
+import os
+import time
+import asyncio
+import threading
+
+from app.services.live_engine import LiveDetector
+
+# =====================================================================
+# CONFIG (override with env vars)
+# =====================================================================
+LIVE_MAX_FPS = float(os.environ.get("LIVE_MAX_FPS", 8))
+LIVE_FRAME_SKIP = int(os.environ.get("LIVE_FRAME_SKIP", 0))
+LIVE_LINGER = float(os.environ.get("LIVE_LINGER", 10))   # keep engine alive after last viewer (s)
+
+
+class LiveBroadcast:
+    """
+    ONE LiveDetector per stream URL, results fanned out to every subscriber.
+
+    Subscribers are asyncio queues (one per SSE/WebSocket client). The engine
+    thread hands results over with call_soon_threadsafe; each queue holds only
+    the newest result, so a slow client skips results instead of lagging.
+    """
+
+    def __init__(self, url, conf=0.25, imgsz=640):
+        self.url = url
+        self._subs = set()          # {(loop, asyncio.Queue)}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.last_unsubscribe = None
+        self.engine = LiveDetector(url, conf=conf, imgsz=imgsz,
+                                   frame_skip=LIVE_FRAME_SKIP, max_fps=LIVE_MAX_FPS,
+                                   on_result=self._publish)
+        self.engine.start()
+
+    @staticmethod
+    def _put_latest(q, item):
+        if q.full():
+            q.get_nowait()
+        q.put_nowait(item)
+
+    def _publish(self, result):
+        with self._lock:
+            self._seq += 1
+            event = {"seq": self._seq, "ts": time.time(), "stream": self.url, "result": result}
+            subs = list(self._subs)
+        for loop, q in subs:
+            try:
+                loop.call_soon_threadsafe(self._put_latest, q, event)
+            except RuntimeError:
+                # event loop already closed → drop that subscriber
+                with self._lock:
+                    self._subs.discard((loop, q))
+
+    def subscribe(self):
+        q = asyncio.Queue(maxsize=1)
+        sub = (asyncio.get_running_loop(), q)
+        with self._lock:
+            self._subs.add(sub)
+            self.last_unsubscribe = None
+        # new viewers get the current result immediately
+        latest = self.engine.latest_result()
+        if latest is not None:
+            q.put_nowait({"seq": self._seq, "ts": time.time(), "stream": self.url, "result": latest})
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subs.discard(sub)
+            if not self._subs:
+                self.last_unsubscribe = time.monotonic()
+
+    @property
+    def subscribers(self):
+        with self._lock:
+            return len(self._subs)
+
+
+class LiveHub:
+    """Owns the LiveBroadcasts; stops an engine LIVE_LINGER s after its last viewer leaves."""
+
+    def __init__(self):
+        self._broadcasts = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+
+    def get(self, url, conf=0.25, imgsz=640):
+        with self._lock:
+            bc = self._broadcasts.get(url)
+            if bc is None or not bc.engine.running:
+                bc = LiveBroadcast(url, conf=conf, imgsz=imgsz)
+                self._broadcasts[url] = bc
+                print("✔ Live broadcast started:", url)
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, daemon=True,
+                                                name="live-hub-reaper")
+                self._reaper.start()
+            return bc
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(1.0)
+            now = time.monotonic()
+            with self._lock:
+                for url, bc in list(self._broadcasts.items()):
+                    if bc.last_unsubscribe and now - bc.last_unsubscribe > LIVE_LINGER:
+                        self._broadcasts.pop(url)
+                        bc.engine.stop(join_timeout=0)
+                        print("⚠ Live broadcast stopped (no viewers):", url)
+
+    def info(self):
+        with self._lock:
+            return [{"url": url, "subscribers": bc.subscribers, "stats": bc.engine.stats()}
+                    for url, bc in self._broadcasts.items()]
+
+    def stop_all(self):
+        with self._lock:
+            broadcasts = list(self._broadcasts.values())
+            self._broadcasts.clear()
+        for bc in broadcasts:
+            bc.engine.stop(join_timeout=0)
+
+
+live_hub = LiveHub()
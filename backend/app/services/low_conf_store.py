@@ -0,0 +1,135 @@
+# backend/app/services/low_conf_store.py
+import os
+import json
+import time
+
+from app.utils.db import connect
+
+# =====================================================================
+# Low-confidence review queue
+#
+#   one row per image (upsert), status "unresolved" → "resolved"
+#   replaces low_conf.json, which was rewritten whole on every append
+#   and never deduped. The legacy file is imported once.
+# =====================================================================
+LOW_CONF_DB = os.path.join("data", "user_object", "low_conf.db")
+LEGACY_FILE = os.path.join("data", "user_object", "low_conf.json")
+
+UNRESOLVED = "unresolved"
+RESOLVED = "resolved"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS low_conf (
+    image TEXT PRIMARY KEY,
+    reason TEXT NOT NULL,
+    bbox TEXT,
+    status TEXT NOT NULL DEFAULT 'unresolved',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS low_conf_by_status ON low_conf (status, updated);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+_UPSERT = """
+INSERT INTO low_conf(image, reason, bbox, status, created, updated) VALUES (?,?,?,?,?,?)
+ON CONFLICT(image) DO UPDATE SET
+    reason=excluded.reason, bbox=excluded.bbox, status=excluded.status, updated=excluded.updated
+"""
+
+
+def _db():
+    db = connect(LOW_CONF_DB, _SCHEMA)
+    _import_legacy(db)
+    return db
+
+
+def _import_legacy(db):
+    """Load low_conf.json once (later duplicates of an image win)."""
+    if db.execute("SELECT 1 FROM meta WHERE key='legacy_imported'").fetchone():
+        return
+    records = []
+    if os.path.exists(LEGACY_FILE):
+        try:
+            with open(LEGACY_FILE, "r") as f:
+                records = json.load(f)
+        except Exception:
+            records = []
+    now = time.time()
+    with db:
+        for r in records:
+            if not isinstance(r, dict) or not r.get("image"):
+                continue
+            db.execute(_UPSERT, (r["image"], r.get("reason", ""), json.dumps(r.get("bbox_px")),
+                                 UNRESOLVED, now, now))
+        db.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('legacy_imported', ?)",
+                   (str(len(records)),))
+
+
+def _row(r):
+    return {
+        "image": r["image"],
+        "reason": r["reason"],
+        "bbox_px": json.loads(r["bbox"]) if r["bbox"] else None,
+        "status": r["status"],
+        "updated": r["updated"],
+    }
+
+
+def upsert(image, reason, bbox=None):
+    """Add or refresh an image in the queue (re-opens it if it was resolved)."""
+    now = time.time()
+    db = _db()
+    with db:
+        db.execute(_UPSERT, (image, reason, json.dumps(list(bbox) if bbox else None),
+                             UNRESOLVED, now, now))
+    return {"image": image, "reason": reason, "bbox_px": list(bbox) if bbox else None,
+            "status": UNRESOLVED}
+
+
+def resolve(image):
+    """Mark an image as handled. Returns False if it was not queued."""
+    db = _db()
+    with db:
+        cur = db.execute("UPDATE low_conf SET status=?, updated=? WHERE image=?",
+                         (RESOLVED, time.time(), image))
+    return cur.rowcount > 0
+
+
+def resolve_many(images):
+    """resolve() for a batch in one transaction. Returns how many were queued."""
+    now = time.time()
+    db = _db()
+    with db:
+        cur = db.executemany("UPDATE low_conf SET status=?, updated=? WHERE image=?",
+                             [(RESOLVED, now, image) for image in images])
+    return cur.rowcount
+
+
+def remove(image):
+    db = _db()
+    with db:
+        db.execute("DELETE FROM low_conf WHERE image=?", (image,))
+
+
+def get(image):
+    r = _db().execute("SELECT * FROM low_conf WHERE image=?", (image,)).fetchone()
+    return _row(r) if r else None
+
+
+def query(status=UNRESOLVED, offset=0, limit=100):
+    """One page of the queue, oldest first → (total, items). status=None lists all."""
+    db = _db()
+    where, args = ("WHERE status=?", (status,)) if status else ("", ())
+    total = db.execute(f"SELECT COUNT(*) FROM low_conf {where}", args).fetchone()[0]
+    rows = db.execute(f"SELECT * FROM low_conf {where} ORDER BY updated, image LIMIT ? OFFSET ?",
+                      args + (limit, offset)).fetchall()
+    return total, [_row(r) for r in rows]
+
+
+def counts():
+    rows = _db().execute("SELECT status, COUNT(*) AS n FROM low_conf GROUP BY status").fetchall()
+    return {r["status"]: r["n"] for r in rows}
@@ -0,0 +1,134 @@
+# backend/app/services/model_backends.py
+import os
+import time
+import shutil
+import importlib.util
+
+# =====================================================================
+# Inference backends (CPU)
+#
+#   torch     – the .pt weights as-is
+#   onnx      – <weights>.onnx served by ONNX Runtime
+#   openvino  – <weights>_openvino_model/ served by OpenVINO
+#
+# ultralytics.YOLO loads all three behind the same predict() API, so the
+# registry only has to pick which artifact to open. Exports are made with
+# dynamic=True (any batch size from the micro-batcher) and cached next to
+# the weights; anything missing or failing falls back to torch.
+# Select per model: MODEL_BACKEND_<NAME>=onnx, else MODEL_BACKEND (torch).
+#
+# Quantized variants (built offline by quantize_models.py) sit next to the
+# fp32 export and are picked with MODEL_VARIANT_<NAME> / MODEL_VARIANT:
+#   onnx:      fp32 | int8-dynamic | int8-static   (<stem>.<variant>.onnx)
+#   openvino:  fp32 | int8                         (<stem>_int8_openvino_model)
+# A variant that has not been built falls back to that backend's fp32.
+# =====================================================================
+BACKENDS = ("torch", "onnx", "openvino")
+VARIANTS = {"torch": ("fp32",),
+            "onnx": ("fp32", "int8-dynamic", "int8-static"),
+            "openvino": ("fp32", "int8")}
+DEFAULT_BACKEND = os.environ.get("MODEL_BACKEND", "torch").lower()
+DEFAULT_VARIANT = os.environ.get("MODEL_VARIANT", "fp32").lower()
+EXPORT_IMGSZ = int(os.environ.get("MODEL_EXPORT_IMGSZ", 640))
+EXPORT_LOCK_STALE_S = 900      # an export lock older than this is from a dead process
+
+_RUNTIME_MODULE = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+
+def backend_for(name):
+    """Configured backend of model `name` (unknown values → torch)."""
+    b = os.environ.get(f"MODEL_BACKEND_{name.upper()}", DEFAULT_BACKEND).lower()
+    return b if b in BACKENDS else "torch"
+
+
+def variant_for(name):
+    """Configured variant of model `name` (validated against its backend later)."""
+    return os.environ.get(f"MODEL_VARIANT_{name.upper()}", DEFAULT_VARIANT).lower()
+
+
+def runtime_available(backend):
+    mod = _RUNTIME_MODULE.get(backend)
+    return mod is None or importlib.util.find_spec(mod) is not None
+
+
+def exported_path(weights, backend, variant="fp32"):
+    """Where the `variant` export of `weights` for `backend` lives."""
+    stem, _ = os.path.splitext(weights)
+    if backend == "onnx":
+        return stem + ".onnx" if variant == "fp32" else f"{stem}.{variant}.onnx"
+    if backend == "openvino":
+        return stem + ("_int8" if variant == "int8" else "") + "_openvino_model"
+    return weights
+
+
+def _is_fresh(artifact, weights):
+    if not os.path.exists(artifact):
+        return False
+    if not os.path.exists(weights):
+        return True
+    return os.path.getmtime(artifact) >= os.path.getmtime(weights)
+
+
+def export(weights, backend, imgsz=EXPORT_IMGSZ):
+    """Export `weights` for `backend` (dynamic batch); returns the artifact path."""
+    if backend == "torch":
+        return weights
+    from ultralytics import YOLO
+
+    fmt = "onnx" if backend == "onnx" else "openvino"
+    out = YOLO(weights).export(format=fmt, dynamic=True, imgsz=imgsz)
+    return str(out) if out else exported_path(weights, backend)
+
+
+def resolve(weights, backend, allow_export=True, variant="fp32"):
+    """
+    (path, backend, variant) to actually load: a built quantized variant, the
+    cached fp32 export when it is current, a fresh export when allowed, else
+    the torch weights.
+    """
+    if backend == "torch":
+        return weights, "torch", "fp32"
+    if not runtime_available(backend):
+        print(f"⚠ {_RUNTIME_MODULE[backend]} not installed → torch for {weights}")
+        return weights, "torch", "fp32"
+
+    if variant != "fp32":
+        if variant in VARIANTS[backend]:
+            quant = exported_path(weights, backend, variant)
+            if _is_fresh(quant, weights):
+                return quant, backend, variant
+            print(f"⚠ {backend} {variant} variant of {weights} not built → fp32")
+        else:
+            print(f"⚠ unknown {backend} variant '{variant}' → fp32")
+
+    artifact = exported_path(weights, backend)
+    if _is_fresh(artifact, weights):
+        return artifact, backend, "fp32"
+    if allow_export:
+        # one exporter across processes (a process-pool worker may race another)
+        lock = artifact + ".lock"
+        try:
+            if os.path.exists(lock) and time.time() - os.path.getmtime(lock) > EXPORT_LOCK_STALE_S:
+                os.remove(lock)
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL))
+        except OSError:
+            print(f"⚠ {backend} export of {weights} in progress elsewhere → torch for now")
+            return weights, "torch", "fp32"
+        try:
+            return export(weights, backend), backend, "fp32"
+        except Exception as e:
+            print(f"⚠ {backend} export of {weights} failed → torch:", e)
+        finally:
+            os.remove(lock)
+    return weights, "torch", "fp32"
+
+
+def remove_exports(weights):
+    """Delete every exported artifact of `weights` (used when pruning versions)."""
+    for backend in ("onnx", "openvino"):
+        for variant in VARIANTS[backend]:
+            p = exported_path(weights, backend, variant)
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            elif os.path.exists(p):
+                os.remove(p)
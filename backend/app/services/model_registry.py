@@ -0,0 +1,444 @@
+# backend/app/services/model_registry.py
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from app.services import model_backends
+
+MODEL_RETRY_S = float(os.environ.get("MODEL_RETRY_S", 30))   # wait before retrying a failed load
+MODEL_FOLLOW_CHECK_S = float(os.environ.get("MODEL_FOLLOW_CHECK_S", 2))   # poll interval of follow=
+
+
+class ModelRegistry:
+    """
+    Keeps every YOLO model loaded ONCE, together with its class names and metadata.
+
+    Each entry is an immutable dict:
+        {"name", "model", "names", "class_map", "path", "version", "backend",
+         "variant", "artifact", "mtime", "loaded_at", "free"}
+    swap()/reload() build and warm a brand new entry OFF the lock, then flip
+    the reference under it, so a caller that grabbed an entry always sees a
+    matching (model, names) pair and requests never wait on a load.
+    Callers that hold an entry across a forward pass use lease(); a replaced
+    entry is kept until its last lease ends (drained), then released.
+    predict() goes through instance(): ultralytics keeps per-call settings
+    (conf, imgsz) on a model's shared predictor and runs it under one lock,
+    so every concurrent caller gets a model instance of its own.
+
+    Models are loaded lazily: register() only records the weights path and the
+    first get() loads it (ultralytics/torch are imported at that point), so
+    processes that never detect never pay for them. warmup() loads ahead of
+    time, e.g. in a background thread on startup.
+
+    A model registered with follow=<callable returning a weights path> tracks
+    that path: get()/lease() poll it (at most every MODEL_FOLLOW_CHECK_S) and
+    swap in the background when it changes, so every process — including
+    process-pool workers with their own registry — picks up a new version.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths = {}        # name -> weights path
+        self._download = {}     # name -> may ultralytics fetch it by name?
+        self._backend = {}      # name -> requested backend (torch | onnx | openvino)
+        self._variant = {}      # name -> requested variant (fp32 | int8-...)
+        self._entries = {}      # name -> entry dict (or missing when not loaded)
+        self._state = {}        # name -> unloaded | loading | ready | missing | failed
+        self._errors = {}       # name -> (error text, monotonic time)
+        self._warm = {}         # name -> dummy inference done
+        self._load_locks = {}   # name -> lock held while loading
+        self._warming = False   # warmup_all() in progress
+        self._leases = {}       # id(entry) -> number of active leases
+        self._retired = {}      # id(entry) -> replaced entry still leased
+        self._required = {}     # name -> must load for ready()
+        self._retrying = set()  # names with a background reload running for ready()
+        self._follow = {}       # name -> callable giving the weights path to serve
+        self._follow_checked = {}   # name -> monotonic time of the last poll
+        self._follow_tried = {}     # name -> (path, monotonic time) of the last follow swap
+
+    # ------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------
+    def register(self, name, weights, load=False, download=False, backend="torch", variant="fp32",
+                 follow=None, required=True):
+        """
+        Register a model under `name`; loads it immediately only if load=True.
+        download=True allows a bare weights name (e.g. "yolov8m.pt") that
+        ultralytics fetches itself; otherwise the file must exist.
+        backend/variant pick the runtime and quantized build (see
+        model_backends); torch fp32 is the fallback.
+        follow: optional cheap callable returning the weights path that should
+        currently be served (e.g. the current model version).
+        required=False: a missing/failed model does not make ready() False
+        (e.g. the custom model before the first training).
+        """
+        with self._lock:
+            self._paths[name] = weights
+            self._required[name] = required
+            if follow is not None:
+                self._follow[name] = follow
+            self._download[name] = download
+            self._backend[name] = backend
+            self._variant[name] = variant
+            self._state.setdefault(name, "unloaded")
+            self._load_locks.setdefault(name, threading.Lock())
+        if load:
+            return self.reload(name, export=True)
+        return False
+
+    @staticmethod
+    def _open_model(artifact):
+        from ultralytics import YOLO
+        return YOLO(artifact, task="detect")
+
+    def _build_entry(self, name, weights, export=False):
+        # export=False on request paths: no fresh export → serve the torch weights
+        artifact, backend, variant = model_backends.resolve(
+            weights, self._backend.get(name, "torch"), allow_export=export,
+            variant=self._variant.get(name, "fp32"))
+        try:
+            model = self._open_model(artifact)
+        except Exception as e:
+            if backend == "torch":
+                raise
+            print(f"⚠ {backend} {variant} load of '{name}' failed → torch:", e)
+            artifact, backend, variant = weights, "torch", "fp32"
+            model = self._open_model(weights)
+        class_map = dict(model.names)
+        return {
+            "name": name,
+            "model": model,
+            "free": [model],        # idle instances, see instance()
+            "names": frozenset(class_map.values()),
+            "class_map": class_map,
+            "path": weights,
+            "version": os.path.splitext(os.path.basename(weights))[0],
+            "backend": backend,
+            "variant": variant,
+            "artifact": artifact,
+            "mtime": os.path.getmtime(weights) if os.path.exists(weights) else None,
+            "loaded_at": time.time(),
+        }
+
+    def _load(self, name, export=False):
+        """Load `name` now (caller holds its load lock). Returns the entry or None."""
+        weights = self._paths.get(name)
+        if weights is None:
+            raise KeyError(f"unknown model: {name}")
+
+        if not self._download[name] and not os.path.exists(weights):
+            with self._lock:
+                self._state[name] = "missing"
+            return None
+
+        with self._lock:
+            self._state[name] = "loading"
+        t0 = time.monotonic()
+        try:
+            entry = self._build_entry(name, weights, export)
+        except Exception as e:
+            with self._lock:
+                self._state[name] = "failed"
+                self._errors[name] = (str(e), time.monotonic())
+            print(f"❌ Failed loading model '{name}' ({weights}):", e)
+            return None
+
+        entry["load_seconds"] = round(time.monotonic() - t0, 3)
+        with self._lock:
+            self._entries[name] = entry
+            self._state[name] = "ready"
+            self._errors.pop(name, None)
+            self._warm[name] = False
+        print(f"✔ Loaded model '{name}':", weights)
+        return entry
+
+    def _dummy_inference(self, entry, imgsz):
+        import numpy as np
+        with self.instance(entry) as model:
+            model.predict(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+
+    def swap(self, name, weights, warm=True, imgsz=640, export=False):
+        """
+        Hot-swap `name` to `weights` (ideally an immutable versioned file):
+        load + warm the new model while the old one keeps serving, then flip
+        the reference atomically. The old entry drains via its leases.
+        On failure the current entry stays in place and False is returned.
+        export=True may build a missing ONNX/OpenVINO export first; off by
+        default since swaps also run from requests (rollback, follow).
+        """
+        if name not in self._paths:
+            raise KeyError(f"unknown model: {name}")
+        with self._load_locks[name]:
+            t0 = time.monotonic()
+            try:
+                entry = self._build_entry(name, weights, export)
+                if warm:
+                    self._dummy_inference(entry, imgsz)
+            except Exception as e:
+                with self._lock:
+                    self._errors[name] = (str(e), time.monotonic())
+                    if name not in self._entries:
+                        self._state[name] = "failed"
+                print(f"❌ Failed swapping model '{name}' to {weights}:", e)
+                return False
+            entry["load_seconds"] = round(time.monotonic() - t0, 3)
+
+            with self._lock:
+                old = self._entries.get(name)
+                self._entries[name] = entry
+                self._paths[name] = weights
+                self._state[name] = "ready"
+                self._warm[name] = warm
+                self._errors.pop(name, None)
+                if old is not None:
+                    self._retire(old)
+        print(f"✔ Swapped model '{name}' to version {entry['version']}")
+        return True
+
+    def reload(self, name, warm=True, export=False):
+        """(Re)load model `name` from its weights path and atomically replace the entry."""
+        if name not in self._paths:
+            raise KeyError(f"unknown model: {name}")
+        return self.swap(name, self._paths[name], warm=warm, export=export)
+
+    # ------------------------------------------------------------
+    # Leases / draining
+    # ------------------------------------------------------------
+    def _retire(self, entry):
+        """Caller holds self._lock. Keep `entry` until its last lease ends."""
+        if self._leases.get(id(entry)):
+            self._retired[id(entry)] = entry
+        else:
+            self._release(entry)
+
+    @staticmethod
+    def _release(entry):
+        """Drop GPU memory held by a model nobody references any more."""
+        import sys
+        torch = sys.modules.get("torch")
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+    @contextmanager
+    def lease(self, name):
+        """
+        with registry.lease("custom") as entry: ...   (entry may be None)
+        The entry stays valid for the whole block even if a swap happens.
+        """
+        if self.get(name) is None:      # lazy load outside the lock
+            yield None
+            return
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None:
+                self._leases[id(entry)] = self._leases.get(id(entry), 0) + 1
+        try:
+            yield entry
+        finally:
+            if entry is not None:
+                with self._lock:
+                    left = self._leases[id(entry)] - 1
+                    if left:
+                        self._leases[id(entry)] = left
+                    else:
+                        del self._leases[id(entry)]
+                        if self._retired.pop(id(entry), None) is not None:
+                            self._release(entry)
+
+    @contextmanager
+    def instance(self, entry):
+        """
+        with registry.instance(entry) as model: model.predict(...)
+        Exclusive use of one model instance of `entry`: an idle one is reused,
+        otherwise another is opened from the same artifact, so there are at
+        most as many instances as concurrent callers (pool workers).
+        """
+        with self._lock:
+            model = entry["free"].pop() if entry["free"] else None
+        if model is None:
+            model = self._open_model(entry["artifact"])
+        try:
+            yield model
+        finally:
+            with self._lock:
+                entry["free"].append(model)
+
+    def versions_in_use(self):
+        """Versions currently serving or still draining."""
+        with self._lock:
+            return {e["version"] for e in list(self._entries.values()) + list(self._retired.values())}
+
+    def warmup(self, name, imgsz=640):
+        """
+        Load `name` if needed and run one dummy inference (CUDA/conv autotune,
+        lazy init). The only lazy load allowed to build a missing export.
+        """
+        entry = self.get(name, export=True)
+        if entry is None or self._warm.get(name):
+            return entry is not None
+        try:
+            self._dummy_inference(entry, imgsz)
+        except Exception as e:
+            print(f"⚠ Warm-up of model '{name}' failed:", e)
+            return False
+        with self._lock:
+            if self._entries.get(name) is entry:
+                self._warm[name] = True
+        return True
+
+    def warmup_all(self, imgsz=640):
+        self._warming = True
+        try:
+            for name in list(self._paths):
+                self.warmup(name, imgsz)
+        finally:
+            self._warming = False
+
+    def start_warmup(self, imgsz=640):
+        """warmup_all() on a daemon thread; returns the thread."""
+        self._warming = True    # ready() is False from now until warm-up ends
+        t = threading.Thread(target=self.warmup_all, args=(imgsz,), daemon=True,
+                             name="model-warmup")
+        t.start()
+        return t
+
+    # ------------------------------------------------------------
+    # Access
+    # ------------------------------------------------------------
+    def get(self, name, load=True, export=False):
+        """
+        Return the current entry dict for `name`, or None if not available.
+        With load=True an unloaded model is loaded on first use (one loader per
+        model; concurrent callers wait for it). Missing weights are re-checked
+        and failed loads are retried after MODEL_RETRY_S. Request-time loads
+        use an existing ONNX/OpenVINO export or the torch weights; only
+        export=True (warm-up) may run the export itself.
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            done = entry is not None or not load or name not in self._paths
+            follow = self._follow_due(name) if entry is not None else None
+        if follow is not None:
+            self._check_follow(name, entry, follow)     # off the lock: reads files
+        if done:
+            return entry
+
+        with self._load_locks[name]:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is not None:
+                    return entry
+                err = self._errors.get(name)
+                if err and time.monotonic() - err[1] < MODEL_RETRY_S:
+                    return None
+                follow = self._follow.get(name)
+            if follow is not None:
+                path = follow()
+                if path:
+                    with self._lock:
+                        self._paths[name] = path
+            return self._load(name, export)
+
+    def _follow_due(self, name):
+        """
+        Caller holds self._lock. The follow callable of `name` if its
+        MODEL_FOLLOW_CHECK_S interval elapsed (claimed for this caller), else None.
+        """
+        follow = self._follow.get(name)
+        if follow is None:
+            return None
+        now = time.monotonic()
+        if now - self._follow_checked.get(name, 0.0) < MODEL_FOLLOW_CHECK_S:
+            return None
+        self._follow_checked[name] = now
+        return follow
+
+    def _check_follow(self, name, entry, follow):
+        """
+        If the followed path moved away from what `entry` serves, swap to it on
+        a background thread (the current entry keeps serving meanwhile). The
+        pointer is read without the lock (it stats/reads files); the lock is
+        only taken to compare and claim the swap. A failed target is retried
+        after MODEL_RETRY_S.
+        """
+        try:
+            path = follow()
+        except Exception as e:
+            print(f"⚠ Version check of model '{name}' failed:", e)
+            return
+        if not path or path == entry["path"] or not os.path.exists(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            tried = self._follow_tried.get(name)
+            if tried and tried[0] == path and now - tried[1] < MODEL_RETRY_S:
+                return
+            self._follow_tried[name] = (path, now)
+        threading.Thread(target=self._follow_swap, args=(name, path), daemon=True,
+                         name=f"model-follow-{name}").start()
+
+    def _follow_swap(self, name, path):
+        with self._lock:
+            entry = self._entries.get(name)
+        if entry is not None and entry["path"] == path:     # e.g. reload_model() got there first
+            return
+        self.swap(name, path)
+
+    def ready(self):
+        """
+        False while a warm-up is running, a model is mid-load, or a required
+        model is missing/failed. A lazily "unloaded" model counts as ready: it
+        loads on the first request, and holding traffic back until then would
+        never let it load. A failed required model is retried in the
+        background (after MODEL_RETRY_S), since an unready worker gets no
+        requests that would retry it.
+        """
+        with self._lock:
+            if self._warming or "loading" in self._state.values():
+                return False
+            broken = [n for n, st in self._state.items()
+                      if st in ("missing", "failed") and self._required.get(n, True)]
+        for name in broken:
+            self._retry_in_background(name)
+        return not broken
+
+    def _retry_in_background(self, name):
+        with self._lock:
+            err = self._errors.get(name)
+            if name in self._retrying or (err and time.monotonic() - err[1] < MODEL_RETRY_S):
+                return
+            self._retrying.add(name)
+
+        def run():
+            try:
+                self.warmup(name)
+            finally:
+                with self._lock:
+                    self._retrying.discard(name)
+
+        threading.Thread(target=run, daemon=True, name=f"model-retry-{name}").start()
+
+    def status(self):
+        """Metadata for every registered model (no model handles)."""
+        with self._lock:
+            out = {}
+            for name, path in self._paths.items():
+                entry = self._entries.get(name)
+                err = self._errors.get(name)
+                out[name] = {
+                    "path": path,
+                    "state": self._state.get(name, "unloaded"),
+                    "loaded": entry is not None,
+                    "warm": self._warm.get(name, False),
+                    "classes": sorted(entry["names"]) if entry else [],
+                    "version": entry["version"] if entry else None,
+                    "backend": entry["backend"] if entry else self._backend.get(name, "torch"),
+                    "variant": entry["variant"] if entry else self._variant.get(name, "fp32"),
+                    "draining": sum(self._leases.get(k, 0) for k, e in self._retired.items()
+                                    if e["name"] == name),
+                    "loaded_at": entry["loaded_at"] if entry else None,
+                    "load_seconds": entry["load_seconds"] if entry else None,
+                    "error": err[0] if err else None,
+                }
+            return out
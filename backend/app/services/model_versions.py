@@ -0,0 +1,138 @@
+# backend/app/services/model_versions.py
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+from app.services import model_backends
+
+# =====================================================================
+# Versioned model weights
+#
+#   app/model/versions/<name>-<YYYYmmdd-HHMMSS>-<hash8>.pt   ← immutable
+#   app/model/current.json  {"custom": "<version id>"}       ← pointer
+#   app/model/best.pt                                         ← mirror of current
+#
+# A version file is fully written under a temp name and renamed into
+# place, and is never modified afterwards, so a loader can never see a
+# half-copied file. Switching versions is one atomic rewrite of
+# current.json.
+# =====================================================================
+MODEL_DIR = os.path.join("app", "model")
+VERSIONS_DIR = os.path.join(MODEL_DIR, "versions")
+CURRENT_FILE = os.path.join(MODEL_DIR, "current.json")
+LEGACY_PATH = os.path.join(MODEL_DIR, "best.pt")
+
+MODEL_KEEP_VERSIONS = int(os.environ.get("MODEL_KEEP_VERSIONS", 5))
+
+
+def _hash_file(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _atomic_copy(src, dst):
+    """Copy src to dst via a temp file in dst's folder + os.replace."""
+    tmp = os.path.join(os.path.dirname(dst) or ".", f".{uuid.uuid4().hex}.tmp")
+    try:
+        shutil.copyfile(src, tmp)
+        with open(tmp, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp, dst)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def version_path(version):
+    return os.path.join(VERSIONS_DIR, version + ".pt")
+
+
+_current_cache = (None, {})     # (stat key of current.json, parsed content)
+
+
+def _read_current():
+    """current.json contents; re-parsed only when the file was replaced (cheap to poll)."""
+    global _current_cache
+    try:
+        st = os.stat(CURRENT_FILE)
+    except OSError:
+        return {}
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if _current_cache[0] != key:
+        try:
+            with open(CURRENT_FILE, "r") as f:
+                _current_cache = (key, json.load(f))
+        except (OSError, ValueError):
+            return {}
+    return dict(_current_cache[1])
+
+
+def current_version(name="custom"):
+    """Version id `name` points at, or None."""
+    v = _read_current().get(name)
+    return v if v and os.path.exists(version_path(v)) else None
+
+
+def current_path(name="custom"):
+    """Weights file of the current version, falling back to the legacy best.pt."""
+    v = current_version(name)
+    if v:
+        return version_path(v)
+    return LEGACY_PATH if name == "custom" else None
+
+
+def publish(src, name="custom"):
+    """
+    Store `src` as a new immutable version (same content → same version).
+    Returns the version id; does not make it current.
+    """
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    digest = _hash_file(src)[:8]
+    for f in os.listdir(VERSIONS_DIR):
+        if f.startswith(name + "-") and f.endswith(f"-{digest}.pt"):
+            return f[:-3]
+    version = f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{digest}"
+    _atomic_copy(src, version_path(version))
+    return version
+
+
+def set_current(version, name="custom"):
+    """Point `name` at `version` (atomic) and mirror it to best.pt for old tooling."""
+    data = _read_current()
+    data[name] = version
+    tmp = f"{CURRENT_FILE}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, CURRENT_FILE)
+    if name == "custom":
+        _atomic_copy(version_path(version), LEGACY_PATH)
+
+
+def list_versions(name="custom"):
+    """Version ids of `name`, oldest first."""
+    if not os.path.isdir(VERSIONS_DIR):
+        return []
+    return sorted(f[:-3] for f in os.listdir(VERSIONS_DIR)
+                  if f.startswith(name + "-") and f.endswith(".pt"))
+
+
+def prune(name="custom", keep=MODEL_KEEP_VERSIONS, in_use=()):
+    """Delete old versions beyond the newest `keep`, never the current or in-use ones."""
+    protect = {current_version(name)} | set(in_use)
+    removed = []
+    for v in list_versions(name)[:-keep or None]:
+        if v in protect:
+            continue
+        try:
+            model_backends.remove_exports(version_path(v))
+            os.remove(version_path(v))
+            removed.append(v)
+        except OSError:
+            pass
+    return removed
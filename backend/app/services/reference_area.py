@@ -0,0 +1,268 @@
+# backend/app/services/reference_area.py
+import os
+import json
+import threading
+
+from app.services.status_store import StatusStore
+
+# =====================================================================
+# Online reference area (median normalized bbox area of the dataset)
+#
+#   P² quantile estimator (Jain & Chlamtac): five markers, O(1) memory
+#   and O(1) work per observation, fed by every NEW label written into the
+#   dataset. Rebuilds (first run, edited/removed labels, the
+#   compute_reference_area.py script) re-seed it at the exact median.
+#   The state is persisted (debounced) next to the value in
+#   reference_area.json, which detect.py hot-reloads by mtime.
+# =====================================================================
+REF_AREA_PATH = os.path.join("data", "user_object", "reference_area.json")
+DATASET_LABELS = os.path.join("data", "user_object", "labels")
+
+
+class P2Quantile:
+    """Streaming estimate of the p-quantile without storing the observations."""
+
+    def __init__(self, p=0.5):
+        self.p = p
+        self.count = 0
+        self.q = []                     # marker heights (first 5 raw values until warm)
+        self.n = [1, 2, 3, 4, 5]        # marker positions
+        self.np = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]   # desired positions
+        self.dn = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        if self.count <= 5:
+            self.q.append(x)
+            if self.count == 5:
+                self.q.sort()
+            return
+
+        q, n = self.q, self.n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.np[i] += self.dn[i]
+
+        for i in (1, 2, 3):
+            d = self.np[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = self._parabolic(i, d)
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def _parabolic(self, i, d):
+        q, n = self.q, self.n
+        return q[i] + d / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count >= 5:
+            return self.q[2]
+        # exact quantile of the few values seen so far
+        s = sorted(self.q)
+        pos = self.p * (len(s) - 1)
+        lo = int(pos)
+        hi = min(lo + 1, len(s) - 1)
+        return s[lo] + (s[hi] - s[lo]) * (pos - lo)
+
+    def to_dict(self):
+        return {"p": self.p, "count": self.count, "q": self.q, "n": self.n, "np": self.np}
+
+    @classmethod
+    def from_sorted(cls, values, p=0.5):
+        """
+        Estimator in the state of having seen the sorted `values`: markers sit
+        on the exact quantiles, so value() is the exact p-quantile until new
+        observations move it.
+        """
+        est = cls(p)
+        N = len(values)
+        if N < 5:
+            for v in values:
+                est.add(v)
+            return est
+
+        def exact(pos):     # 1-based fractional position → interpolated value
+            lo = int(pos) - 1
+            hi = min(lo + 1, N - 1)
+            return values[lo] + (values[hi] - values[lo]) * (pos - 1 - lo)
+
+        est.count = N
+        est.np = [1, 1 + (N - 1) * p / 2, 1 + (N - 1) * p, 1 + (N - 1) * (1 + p) / 2, N]
+        est.q = [exact(x) for x in est.np]
+        n = [int(round(x)) for x in est.np]
+        for i in range(1, 5):           # marker positions must stay strictly increasing
+            n[i] = min(max(n[i], n[i - 1] + 1), N - (4 - i))
+        est.n = n
+        return est
+
+    @classmethod
+    def from_dict(cls, d):
+        est = cls(d.get("p", 0.5))
+        est.count = d["count"]
+        est.q = list(d["q"])
+        est.n = list(d["n"])
+        est.np = list(d["np"])
+        return est
+
+
+def _label_areas(text):
+    """Normalized w*h of each well-formed line of a YOLO label."""
+    areas = []
+    for line in text.splitlines():
+        parts = line.split()
+        if len(parts) != 5:
+            continue
+        try:
+            w, h = float(parts[3]), float(parts[4])
+        except ValueError:
+            continue
+        if w > 0 and h > 0:
+            areas.append(w * h)
+    return areas
+
+
+class ReferenceArea:
+    def __init__(self, path=REF_AREA_PATH, label_dir=DATASET_LABELS, index=None):
+        self.path = path
+        self.label_dir = os.path.normpath(label_dir)
+        self._index = index         # DatasetIndex over label_dir (None = the shared one)
+        self._lock = threading.Lock()
+        self._store = None
+        self._est = None
+        self._rebuilding = False    # background rebuild thread running
+        self._dirty = False         # another rebuild pass requested
+
+    def _load(self):
+        if self._store is not None:
+            return
+        initial = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    initial = json.load(f)
+            except Exception:
+                initial = {}
+        self._store = StatusStore(self.path, initial, log_key=None)
+        if "p2" in initial:
+            self._est = P2Quantile.from_dict(initial["p2"])
+
+    def _scan(self):
+        """
+        Estimator rebuilt from every box in the dataset labels (labels only):
+        seeded from the sorted areas, so it starts at the exact median.
+        """
+        index = self._index
+        if index is None:
+            from app.services.dataset_index import dataset_index as index
+        index.refresh_labels()
+        return P2Quantile.from_sorted(sorted(index.iter_box_areas()))
+
+    def start_bootstrap(self):
+        """
+        No estimator state yet → build it from the dataset on a daemon thread
+        (once). Returns the thread, or None when there is nothing to do.
+        """
+        with self._lock:
+            self._load()
+            if self._est is not None:
+                return None
+        return self._schedule_rebuild()
+
+    def _schedule_rebuild(self):
+        """Rebuild on a daemon thread; calls while one runs just queue one more pass."""
+        with self._lock:
+            self._dirty = True
+            if self._rebuilding:
+                return None
+            self._rebuilding = True
+        t = threading.Thread(target=self._rebuild_loop, daemon=True, name="ref-area-rebuild")
+        t.start()
+        return t
+
+    def _rebuild_loop(self):
+        try:
+            while True:
+                with self._lock:
+                    if not self._dirty:
+                        return
+                    self._dirty = False
+                est = self._scan()
+                with self._lock:
+                    self._load()
+                    self._est = est
+                    self._publish()
+        except Exception as e:
+            print("⚠ Reference area rebuild failed:", e)
+        finally:
+            with self._lock:
+                self._rebuilding = False
+
+    def _publish(self, force=False):
+        value = self._est.value()
+        if value is not None:
+            self._store["reference_area_norm"] = value
+        self._store["count"] = self._est.count
+        self._store["p2"] = self._est.to_dict()
+        self._store.save(force=force)
+
+    def _in_dataset(self, label_path):
+        return os.path.normpath(os.path.dirname(label_path)) == self.label_dir
+
+    def observe_label(self, label_path, text, replaced=False):
+        """
+        Called for every label write; only dataset labels count. New boxes
+        feed the estimator. A replaced label (its old boxes are already in the
+        estimate), a write during a rebuild, or no estimator yet schedule a
+        background rebuild instead, so edits never count boxes twice and
+        requests never wait on a scan.
+        """
+        if not self._in_dataset(label_path):
+            return
+        areas = _label_areas(text)
+        with self._lock:
+            self._load()
+            if self._est is not None and not replaced and not self._rebuilding:
+                for a in areas:
+                    self._est.add(a)
+                self._publish()
+                return
+        self._schedule_rebuild()
+
+    def invalidate(self, label_path):
+        """A dataset label was removed → its boxes leave the estimate via a rebuild."""
+        if self._in_dataset(label_path):
+            self._schedule_rebuild()
+
+    def rebuild(self):
+        """Recompute from the whole dataset now (exact median) and write it."""
+        est = self._scan()
+        with self._lock:
+            self._load()
+            self._est = est
+            self._publish(force=True)
+            return self._est.value()
+
+    def value(self):
+        with self._lock:
+            self._load()
+            return self._store.get("reference_area_norm")
+
+
+reference_area = ReferenceArea()
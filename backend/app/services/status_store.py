@@ -0,0 +1,126 @@
+# backend/app/services/status_store.py
+import os
+import json
+import time
+import atexit
+import threading
+import traceback
+from collections import deque
+
+STATUS_LOG_MAX = int(os.environ.get("STATUS_LOG_MAX", 500))           # log lines kept
+STATUS_SAVE_INTERVAL_MS = int(os.environ.get("STATUS_SAVE_INTERVAL_MS", 1000))
+
+
+class StatusStore:
+    """
+    In-memory status dict (training + upload progress) with cheap persistence.
+
+    - behaves like a dict: state["x"], state.get(), state.update()
+    - the log list is a ring buffer (last STATUS_LOG_MAX lines)
+    - save() is debounced: at most one snapshot every STATUS_SAVE_INTERVAL_MS,
+      written atomically (tmp file + os.replace); save(force=True) writes now
+    - API endpoints read straight from memory, never from the file
+    """
+
+    def __init__(self, path, initial, log_key="log", log_max=STATUS_LOG_MAX,
+                 interval_ms=STATUS_SAVE_INTERVAL_MS):
+        self.path = path
+        self.log_key = log_key
+        self.log_max = log_max
+        self.interval = interval_ms / 1000.0
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()     # one writer of the tmp file at a time
+        self._data = {}
+        self._dirty = False
+        self._timer = None
+        self._last_write = 0.0
+        self.update(initial)
+        atexit.register(self.flush)
+
+    # ------------------------------------------------------------
+    # dict interface
+    # ------------------------------------------------------------
+    def _wrap(self, key, value):
+        if key == self.log_key and not isinstance(value, deque):
+            return deque(value or [], maxlen=self.log_max)
+        return value
+
+    def __getitem__(self, key):
+        with self._lock:
+            return self._data[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data[key] = self._wrap(key, value)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def update(self, values):
+        with self._lock:
+            for k, v in values.items():
+                self._data[k] = self._wrap(k, v)
+
+    def snapshot(self):
+        """JSON-safe copy of the current state."""
+        with self._lock:
+            out = {}
+            for k, v in self._data.items():
+                if isinstance(v, deque):
+                    v = list(v)
+                elif isinstance(v, (list, dict)):
+                    v = json.loads(json.dumps(v))
+                out[k] = v
+            return out
+
+    # ------------------------------------------------------------
+    # persistence
+    # ------------------------------------------------------------
+    def save(self, force=False):
+        """Mark state dirty and persist it, debounced unless force=True."""
+        with self._lock:
+            self._dirty = True
+            if force:
+                self._cancel_timer()
+            else:
+                wait = self.interval - (time.monotonic() - self._last_write)
+                if wait > 0:
+                    if self._timer is None:
+                        self._timer = threading.Timer(wait, self.flush)
+                        self._timer.daemon = True
+                        self._timer.start()
+                    return
+        self.flush()
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        """Write the snapshot now if anything changed since the last write."""
+        with self._write_lock:
+            with self._lock:
+                self._timer = None
+                if not self._dirty:
+                    return
+                data = self.snapshot()
+                self._dirty = False
+                self._last_write = time.monotonic()
+            self._write(data)
+
+    def _write(self, data):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except Exception:
+            print("WARN: failed to write status file:", self.path)
+            traceback.print_exc()
@@ -0,0 +1,201 @@
+# backend/app/services/stream_manager.py
+import os
+import time
+import threading
+import cv2
+
+# =====================================================================
+# CONFIG (override with env vars)
+# =====================================================================
+STREAM_IDLE_TTL = float(os.environ.get("STREAM_IDLE_TTL", 30))        # seconds without reads
+STREAM_OPEN_TIMEOUT = float(os.environ.get("STREAM_OPEN_TIMEOUT", 5))  # first frame wait
+STREAM_RECONNECT_DELAY = 1.0
+
+
+class StreamReader:
+    """
+    One background thread per URL: keeps the connection open and always holds
+    the LATEST decoded frame in memory (older frames are simply overwritten).
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._lock = threading.Lock()
+        self._new_frame = threading.Condition(self._lock)
+        self._frame = None
+        self._frame_id = 0
+        self._frame_ts = None
+        self._first_frame = threading.Event()
+        self._stop = threading.Event()
+        self.error = None
+        self.opened = False
+        self.last_access = time.monotonic()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name="stream-reader")
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            cap = cv2.VideoCapture(self.url)
+            if not cap.isOpened():
+                self.error = "cannot_open_stream"
+                self.opened = False
+                cap.release()
+                self._first_frame.set()   # wake waiters so they can report the error
+                self._stop.wait(STREAM_RECONNECT_DELAY)
+                continue
+
+            self.opened = True
+            self.error = None
+
+            while not self._stop.is_set():
+                ok, frame = cap.read()
+                if not ok or frame is None:
+                    self.error = "cannot_read_frame"
+                    break
+                with self._lock:
+                    self._frame = frame
+                    self._frame_id += 1
+                    self._frame_ts = time.time()
+                    self._new_frame.notify_all()
+                self._first_frame.set()
+
+            cap.release()
+            self.opened = False
+            if not self._stop.is_set():
+                self._stop.wait(STREAM_RECONNECT_DELAY)
+
+    def latest(self, wait=STREAM_OPEN_TIMEOUT):
+        """Return (frame, frame_id, timestamp); waits up to `wait` s for the first frame."""
+        self.last_access = time.monotonic()
+        if self._frame is None:
+            self._first_frame.wait(wait)
+        with self._lock:
+            return self._frame, self._frame_id, self._frame_ts
+
+    def wait_frame(self, after_id, timeout=1.0):
+        """
+        Block until a frame newer than `after_id` arrives (or `timeout` s pass).
+        Returns (frame, frame_id, timestamp); frame_id == after_id means none came.
+        For consumers that want every new frame instead of polling latest().
+        """
+        self.last_access = time.monotonic()
+        with self._new_frame:
+            if self._frame_id == after_id and not self._stop.is_set():
+                self._new_frame.wait(timeout)
+            return self._frame, self._frame_id, self._frame_ts
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        self._stop.set()
+        with self._new_frame:
+            self._new_frame.notify_all()
+
+    def info(self):
+        with self._lock:
+            return {
+                "url": self.url,
+                "opened": self.opened,
+                "error": self.error,
+                "frames": self._frame_id,
+                "last_frame_age": (time.time() - self._frame_ts) if self._frame_ts else None,
+                "idle_for": time.monotonic() - self.last_access,
+            }
+
+
+class StreamManager:
+    """
+    Registry of StreamReaders keyed by URL; idle readers are stopped after a TTL.
+    Long-lived consumers (hub cameras, live detectors) acquire()/release() a
+    URL: a reader with holders is never reaped, and releasing only makes it
+    reapable, so one consumer leaving never cuts off another on the same URL.
+    """
+
+    def __init__(self, idle_ttl=STREAM_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._readers = {}
+        self._holders = {}          # url -> number of acquire()s not yet released
+        self._lock = threading.Lock()
+        self._janitor = None
+
+    def get(self, url):
+        with self._lock:
+            reader = self._readers.get(url)
+            if reader is None:
+                reader = StreamReader(url)
+                self._readers[url] = reader
+                print("✔ Stream reader started:", url)
+            if self._janitor is None:
+                self._janitor = threading.Thread(target=self._reap_loop, daemon=True,
+                                                 name="stream-janitor")
+                self._janitor.start()
+            return reader
+
+    def peek(self, url):
+        """The reader of url if one is running (never starts one)."""
+        with self._lock:
+            return self._readers.get(url)
+
+    def acquire(self, url):
+        """get(url) and hold the reader open until release(url)."""
+        with self._lock:
+            self._holders[url] = self._holders.get(url, 0) + 1
+        return self.get(url)
+
+    def release(self, url):
+        """Drop one hold; the reader is reaped once idle and unheld."""
+        with self._lock:
+            left = self._holders.get(url, 0) - 1
+            if left > 0:
+                self._holders[url] = left
+            else:
+                self._holders.pop(url, None)
+            reader = self._readers.get(url)
+        if reader is not None:
+            reader.last_access = time.monotonic()   # idle TTL counts from now
+
+    def latest_frame(self, url, wait=STREAM_OPEN_TIMEOUT):
+        """Latest in-memory frame for url → (frame or None, error or None)."""
+        reader = self.get(url)
+        frame, _, _ = reader.latest(wait)
+        if frame is None:
+            return None, reader.error or "cannot_read_frame"
+        return frame, None
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(max(1.0, self.idle_ttl / 4))
+            now = time.monotonic()
+            with self._lock:
+                idle = [u for u, r in self._readers.items()
+                        if not self._holders.get(u) and now - r.last_access > self.idle_ttl]
+                for url in idle:
+                    self._readers.pop(url).stop()
+                    print("⚠ Stream reader stopped (idle):", url)
+
+    def stop(self, url):
+        with self._lock:
+            reader = self._readers.pop(url, None)
+        if reader:
+            reader.stop()
+            return True
+        return False
+
+    def stop_all(self):
+        with self._lock:
+            readers = list(self._readers.values())
+            self._readers.clear()
+        for r in readers:
+            r.stop()
+
+    def info(self):
+        with self._lock:
+            return [{**r.info(), "holders": self._holders.get(u, 0)}
+                    for u, r in self._readers.items()]
+
+
+# shared instance used by the detect service and routes
+stream_manager = StreamManager()
@@ -1,7 +1,10 @@
 import os
+from app.services import blob_store
 
 def clear_cache(folder="data/cache/"):
     if not os.path.exists(folder):
         return
     for f in os.listdir(folder):
         os.remove(os.path.join(folder, f))
+    blob_store.forget_dir(folder)
+    blob_store.gc()     # free blobs nothing else links to
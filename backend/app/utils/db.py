@@ -0,0 +1,28 @@
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+
+def connect(path, schema=None):
+    """
+    Per-thread SQLite connection for `path` (created on first use, WAL mode).
+    `schema` (SQL script) is executed once per new connection, so it must be
+    idempotent (CREATE ... IF NOT EXISTS).
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+
+    conn = conns.get(path)
+    if conn is None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if schema:
+            conn.executescript(schema)
+        conns[path] = conn
+    return conn
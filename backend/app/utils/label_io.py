@@ -0,0 +1,43 @@
+import os
+import shutil
+import uuid
+
+from app.services.label_index import label_index
+from app.services.reference_area import reference_area
+
+# Classes the training set is built with (data.yaml nc); class 0 is the user's object
+NUM_CLASSES = int(os.environ.get("LABEL_NUM_CLASSES", 1))
+
+
+def write_label(label_path, text):
+    """
+    Write a YOLO label file atomically (tmp + rename), then update the label
+    index and the online reference area.
+    """
+    os.makedirs(os.path.dirname(label_path) or ".", exist_ok=True)
+    tmp = f"{label_path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    replaced = os.path.exists(label_path)
+    os.replace(tmp, label_path)
+    label_index.notify(label_path)
+    reference_area.observe_label(label_path, text, replaced=replaced)
+
+
+def copy_label(src_path, label_path):
+    shutil.copyfile(src_path, label_path)
+    label_index.notify(label_path)
+
+
+def remove_label(label_path):
+    if os.path.exists(label_path):
+        os.remove(label_path)
+        reference_area.invalidate(label_path)
+    label_index.notify(label_path)
+
+
+def clear_labels(folder):
+    """Wipe and recreate a label folder."""
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder, exist_ok=True)
+    label_index.notify_dir_cleared(folder)
@@ -0,0 +1,86 @@
+from collections import deque
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+async def iter_multipart(request):
+    """
+    Parse a multipart/form-data body WHILE it is being received.
+
+    Yields events as soon as the bytes arrive (nothing is buffered whole):
+        ("field", name, value)          small text field
+        ("file_start", name, filename)  a file part begins
+        ("file_data", chunk)            next chunk of that file
+        ("file_end",)                   file part complete
+    Raises ValueError for a non-multipart request.
+    """
+    ctype, params = parse_options_header(request.headers.get("content-type", ""))
+    if ctype != b"multipart/form-data" or b"boundary" not in params:
+        raise ValueError("expected multipart/form-data")
+
+    events = deque()
+    part = {}
+    header = {"field": b"", "value": b""}
+
+    def on_part_begin():
+        part.clear()
+        part["headers"] = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        part["headers"][header["field"].lower()] = header["value"]
+        header["field"] = b""
+        header["value"] = b""
+
+    def on_headers_finished():
+        _, disp = parse_options_header(part["headers"].get(b"content-disposition", b""))
+        name = disp.get(b"name", b"").decode("utf-8", "replace")
+        filename = disp.get(b"filename")
+        part["name"] = name
+        if filename is not None:
+            part["file"] = True
+            events.append(("file_start", name, filename.decode("utf-8", "replace")))
+        else:
+            part["file"] = False
+            part["value"] = b""
+
+    def on_part_data(data, start, end):
+        if part.get("file"):
+            events.append(("file_data", bytes(data[start:end])))
+        else:
+            part["value"] += data[start:end]
+
+    def on_part_end():
+        if part.get("file"):
+            events.append(("file_end",))
+        else:
+            events.append(("field", part.get("name", ""),
+                           part.get("value", b"").decode("utf-8", "replace")))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+
+    async for chunk in request.stream():
+        if chunk:
+            parser.write(chunk)
+        while events:
+            yield events.popleft()
+
+    parser.finalize()
+    while events:
+        yield events.popleft()
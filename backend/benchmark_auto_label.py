@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+
+import cv2
+
+from app.services.auto_label import contour_geometry, FAST_MAX_SIDE
+
+# Compare the full-resolution contour pipeline with the downscaled fast path
+# against the labels in the dataset.
+#   python benchmark_auto_label.py [limit]
+IMG_DIR = "data/user_object/images/"
+LABEL_DIR = "data/user_object/labels/"
+
+limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+
+def read_label_box(path, w, h):
+    """First YOLO line → pixel (x, y, w, h), or None."""
+    with open(path, "r") as f:
+        parts = f.readline().strip().split()
+    if len(parts) != 5:
+        return None
+    xc, yc, bw, bh = (float(v) for v in parts[1:])
+    return ((xc - bw / 2) * w, (yc - bh / 2) * h, bw * w, bh * h)
+
+
+def iou(a, b):
+    if a is None or b is None:
+        return 0.0
+    ax1, ay1 = a[0] + a[2], a[1] + a[3]
+    bx1, by1 = b[0] + b[2], b[1] + b[3]
+    iw = max(0.0, min(ax1, bx1) - max(a[0], b[0]))
+    ih = max(0.0, min(ay1, by1) - max(a[1], b[1]))
+    inter = iw * ih
+    union = a[2] * a[3] + b[2] * b[3] - inter
+    return inter / union if union > 0 else 0.0
+
+
+if not os.path.isdir(IMG_DIR) or not os.path.isdir(LABEL_DIR):
+    print("No dataset found at", IMG_DIR)
+    exit()
+
+names = sorted(os.listdir(IMG_DIR))[:limit]
+
+t_full = t_fast = 0.0
+iou_full, iou_fast, iou_agree = [], [], []
+
+for name in names:
+    label = os.path.join(LABEL_DIR, os.path.splitext(name)[0] + ".txt")
+    img = cv2.imread(os.path.join(IMG_DIR, name))
+    if img is None or not os.path.exists(label):
+        continue
+    h, w = img.shape[:2]
+    truth = read_label_box(label, w, h)
+
+    t0 = time.perf_counter()
+    _, box_full = contour_geometry(img)
+    t1 = time.perf_counter()
+    _, box_fast = contour_geometry(img, fast=True)
+    t2 = time.perf_counter()
+
+    t_full += t1 - t0
+    t_fast += t2 - t1
+    iou_full.append(iou(box_full, truth))
+    iou_fast.append(iou(box_fast, truth))
+    iou_agree.append(iou(box_full, box_fast))
+
+n = len(iou_full)
+if n == 0:
+    print("No labeled images found!")
+    exit()
+
+print(f"Images:            {n}  (fast max side = {FAST_MAX_SIDE})")
+print(f"Full  avg time:    {t_full / n * 1000:.1f} ms   mean IoU vs labels: {sum(iou_full) / n:.3f}")
+print(f"Fast  avg time:    {t_fast / n * 1000:.1f} ms   mean IoU vs labels: {sum(iou_fast) / n:.3f}")
+print(f"Speedup:           {t_full / t_fast:.2f}x" if t_fast > 0 else "Speedup:           n/a")
+print(f"Fast vs full IoU:  {sum(iou_agree) / n:.3f}")
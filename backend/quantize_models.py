@@ -0,0 +1,332 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+import cv2
+import numpy as np
+
+from app.services import model_backends, model_versions
+from app.services.detect import DEFAULT_MODEL_WEIGHTS, INFER_IMGSZ, letterbox
+
+# Build INT8 variants of the custom + default models and compare them
+# (accuracy, latency, memory) against fp32.
+#   python quantize_models.py [--models custom default] [--calib 100]
+# Serve a variant with e.g. MODEL_BACKEND_CUSTOM=onnx MODEL_VARIANT_CUSTOM=int8-static
+#
+# Accuracy is measured per model with the method that is meaningful for it:
+#   custom  → "map":       mAP against data/user_object/labels (its own classes)
+#   default → "agreement": the labels' class 0 is the user's object, not a COCO
+#                          class, so mAP would be meaningless; instead each
+#                          variant's boxes are matched against torch fp32's on
+#                          the same images (same class, IoU >= AGREE_IOU) → F1.
+IMG_DIR = "data/user_object/images/"
+REPORT_PATH = "data/quantization_report.json"
+EVAL_YAML = "data/quantization_eval.yaml"
+REF_PREDS = "data/quantization_ref_{}.json"     # torch fp32 boxes per model
+ACCURACY_METHOD = {"custom": "map", "default": "agreement"}
+AGREE_IOU = 0.5
+
+
+def model_weights(name):
+    if name == "custom":
+        return model_versions.current_path("custom")
+    return DEFAULT_MODEL_WEIGHTS
+
+
+def image_paths(limit):
+    names = sorted(f for f in os.listdir(IMG_DIR) if f.lower().endswith((".jpg", ".jpeg", ".png")))
+    return [os.path.join(IMG_DIR, f) for f in names[:limit]]
+
+
+def to_input(path, imgsz):
+    """Same preprocessing as detect.preprocess_batch, as a (1,3,S,S) float32 array."""
+    img = cv2.imread(path)
+    if img is None:
+        return None
+    lb, _, _ = letterbox(img, imgsz)
+    x = lb[..., ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(x)
+
+
+# =====================================================================
+# BUILD
+# =====================================================================
+def fp32_onnx(weights, imgsz):
+    path = model_backends.exported_path(weights, "onnx")
+    if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(weights):
+        return path
+    return model_backends.export(weights, "onnx", imgsz)
+
+
+def build_onnx_dynamic(weights, imgsz):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    fp32 = fp32_onnx(weights, imgsz)
+    out = model_backends.exported_path(weights, "onnx", "int8-dynamic")
+    quantize_dynamic(fp32, out, weight_type=QuantType.QInt8)
+    return out
+
+
+def build_onnx_static(weights, calib_paths, imgsz):
+    import onnxruntime as ort
+    from onnxruntime.quantization import (quantize_static, CalibrationDataReader,
+                                          QuantFormat, QuantType)
+
+    fp32 = fp32_onnx(weights, imgsz)
+    out = model_backends.exported_path(weights, "onnx", "int8-static")
+    input_name = ort.InferenceSession(fp32, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.it = (x for x in map(lambda p: to_input(p, imgsz), calib_paths) if x is not None)
+
+        def get_next(self):
+            x = next(self.it, None)
+            return None if x is None else {input_name: x}
+
+    quantize_static(fp32, out, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                    per_channel=True)
+    return out
+
+
+def build_openvino_int8(weights, imgsz):
+    from ultralytics import YOLO
+
+    # NNCF post-training quantization, calibrated on the dataset in EVAL_YAML
+    out = YOLO(weights).export(format="openvino", int8=True, dynamic=True,
+                               data=os.path.abspath(EVAL_YAML), imgsz=imgsz)
+    return str(out)
+
+
+def write_eval_yaml(names):
+    root = os.path.abspath(os.path.join("data", "user_object"))
+    with open(EVAL_YAML, "w", encoding="utf-8") as f:
+        f.write(f"path: {root}\ntrain: images\nval: images\n")
+        f.write(f"nc: {len(names)}\nnames: {json.dumps(names)}\n")
+
+
+# =====================================================================
+# MEASURE (one subprocess per variant so peak memory is per variant)
+# =====================================================================
+def _iou(a, b):
+    iw = min(a[2], b[2]) - max(a[0], b[0])
+    ih = min(a[3], b[3]) - max(a[1], b[1])
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter)
+
+
+def agreement(preds, ref, iou_thr=AGREE_IOU):
+    """
+    How closely `preds` reproduces the fp32 reference `ref` (per image lists
+    of [x1, y1, x2, y2, conf, cls]): greedy same-class matching by confidence,
+    then precision / recall / F1 of the matches and their mean IoU.
+    """
+    tp = n_pred = n_ref = 0
+    ious = []
+    for p, r in zip(preds, ref):
+        n_pred += len(p)
+        n_ref += len(r)
+        used = set()
+        for b in sorted(p, key=lambda b: -b[4]):
+            best, best_j = iou_thr, None
+            for j, rb in enumerate(r):
+                if j in used or rb[5] != b[5]:
+                    continue
+                iou = _iou(b, rb)
+                if iou >= best:
+                    best, best_j = iou, j
+            if best_j is not None:
+                used.add(best_j)
+                tp += 1
+                ious.append(best)
+    precision = tp / n_pred if n_pred else 1.0
+    recall = tp / n_ref if n_ref else 1.0
+    return {
+        "agree_precision": round(precision, 4),
+        "agree_recall": round(recall, 4),
+        "agree_f1": round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+        "agree_iou_mean": round(sum(ious) / len(ious), 4) if ious else None,
+    }
+
+
+def measure(path, imgsz, n_latency, method="map", reference=None, dump=None):
+    """
+    Latency + peak memory of one artifact, plus accuracy by `method`:
+    "map" validates against EVAL_YAML; "agreement" compares the boxes predicted
+    on the latency images with the fp32 ones in `reference` (dump= writes them).
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(path, task="detect")
+    metrics = None
+    if method == "map":
+        metrics = model.val(data=EVAL_YAML, imgsz=imgsz, batch=1, plots=False, verbose=False)
+    inputs = [x for x in (to_input(p, imgsz) for p in image_paths(n_latency)) if x is not None]
+
+    import torch
+    times = []
+    preds = []
+    if inputs:
+        model.predict(torch.from_numpy(inputs[0]), verbose=False)   # warm-up
+        for x in inputs:
+            t0 = time.perf_counter()
+            r = model.predict(torch.from_numpy(x), verbose=False)[0]
+            times.append((time.perf_counter() - t0) * 1000)
+            preds.append(r.boxes.data[:, :6].cpu().numpy().tolist())
+    times.sort()
+
+    try:
+        import resource     # POSIX: peak RSS of this process (KB on Linux)
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:     # Windows: current RSS after the run
+        import psutil
+        peak_mb = psutil.Process().memory_info().rss / 1e6
+
+    out = {
+        "latency_ms_mean": sum(times) / len(times) if times else None,
+        "latency_ms_p95": times[int(len(times) * 0.95) - 1] if times else None,
+        "rss_mb": round(peak_mb, 1),
+    }
+    if metrics is not None:
+        out["map50"] = float(metrics.box.map50)
+        out["map50_95"] = float(metrics.box.map)
+    if dump:
+        with open(dump, "w") as f:
+            json.dump(preds, f)
+    if method == "agreement" and reference and os.path.exists(reference):
+        with open(reference) as f:
+            out.update(agreement(preds, json.load(f)))
+    return out
+
+
+def measure_in_subprocess(path, imgsz, n_latency, method="map", reference=None, dump=None):
+    cmd = [sys.executable, __file__, "--measure", path, "--imgsz", str(imgsz),
+           "--latency-images", str(n_latency), "--method", method]
+    if reference:
+        cmd += ["--reference", reference]
+    if dump:
+        cmd += ["--dump", dump]
+    out = subprocess.run(cmd, capture_output=True, text=True)
+    for line in reversed(out.stdout.splitlines()):
+        if line.startswith("MEASURE "):
+            return json.loads(line[len("MEASURE "):])
+    return {"error": (out.stderr or out.stdout).strip().splitlines()[-1:] or ["measure failed"]}
+
+
+def _fmt(v, spec):
+    return format(v, spec) if isinstance(v, (int, float)) else "-"
+
+
+def artifact_size_mb(path):
+    if os.path.isdir(path):
+        return round(sum(os.path.getsize(os.path.join(d, f))
+                         for d, _, fs in os.walk(path) for f in fs) / 1e6, 1)
+    return round(os.path.getsize(path) / 1e6, 1)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--models", nargs="+", default=["custom", "default"])
+    ap.add_argument("--calib", type=int, default=100, help="calibration images")
+    ap.add_argument("--latency-images", type=int, default=50)
+    ap.add_argument("--imgsz", type=int, default=INFER_IMGSZ)
+    ap.add_argument("--measure", help=argparse.SUPPRESS)
+    ap.add_argument("--method", default="map", help=argparse.SUPPRESS)
+    ap.add_argument("--reference", help=argparse.SUPPRESS)
+    ap.add_argument("--dump", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.measure:
+        print("MEASURE " + json.dumps(measure(args.measure, args.imgsz, args.latency_images,
+                                              args.method, args.reference, args.dump)))
+        return
+
+    calib = image_paths(args.calib)
+    if not calib:
+        print("No images found in", IMG_DIR)
+        return
+
+    from ultralytics import YOLO
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "calibration_images": len(calib),
+              "accuracy_methods": {
+                  "map": "mAP50 / mAP50-95 against data/user_object/labels",
+                  "agreement": f"boxes matched to torch:fp32 on the latency images "
+                               f"(same class, IoU >= {AGREE_IOU}): precision / recall / F1, mean IoU",
+              },
+              "models": {}}
+
+    for name in args.models:
+        weights = model_weights(name)
+        if not weights or (name == "custom" and not os.path.exists(weights)):
+            print(f"Skipping {name}: no weights")
+            continue
+        names = list(dict(YOLO(weights).names).values())
+        write_eval_yaml(names)     # also the openvino int8 calibration set
+        method = ACCURACY_METHOD.get(name, "agreement")
+        ref_preds = REF_PREDS.format(name)
+
+        variants = {"torch:fp32": lambda: weights}
+        if model_backends.runtime_available("onnx"):
+            variants["onnx:fp32"] = lambda: fp32_onnx(weights, args.imgsz)
+            variants["onnx:int8-dynamic"] = lambda: build_onnx_dynamic(weights, args.imgsz)
+            variants["onnx:int8-static"] = lambda: build_onnx_static(weights, calib, args.imgsz)
+        if model_backends.runtime_available("openvino"):
+            variants["openvino:fp32"] = lambda: model_backends.export(weights, "openvino", args.imgsz)
+            variants["openvino:int8"] = lambda: build_openvino_int8(weights, args.imgsz)
+
+        rows = {}
+        for key, build in variants.items():
+            print(f"[{name}] {key}: building ...")
+            try:
+                t0 = time.time()
+                path = build()
+                row = {"path": path, "build_s": round(time.time() - t0, 1),
+                       "size_mb": artifact_size_mb(path)}
+            except Exception as e:
+                rows[key] = {"error": str(e)}
+                print(f"[{name}] {key}: build failed:", e)
+                continue
+            print(f"[{name}] {key}: measuring ...")
+            # torch:fp32 runs first and records the reference boxes for "agreement"
+            is_ref = key == "torch:fp32"
+            row.update(measure_in_subprocess(path, args.imgsz, args.latency_images, method,
+                                             reference=None if is_ref else ref_preds,
+                                             dump=ref_preds if is_ref and method == "agreement" else None))
+            if is_ref and method == "agreement" and "error" not in row:
+                row.update(agree_precision=1.0, agree_recall=1.0, agree_f1=1.0, agree_iou_mean=1.0)
+            rows[key] = row
+        report["models"][name] = {"weights": weights, "classes": names,
+                                  "accuracy_method": method, "variants": rows}
+
+    with open(REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+
+    for name, m in report["models"].items():
+        base = m["variants"].get("torch:fp32", {})
+        # accuracy columns depend on the model's method (see accuracy_methods)
+        acc = ("map50", "map50_95", "mAP50", "mAP50-95") if m["accuracy_method"] == "map" \
+            else ("agree_f1", "agree_iou_mean", "agreeF1", "agreeIoU")
+        print()
+        print(f"{'model':8} {'variant':20} {acc[2]:>8} {acc[3]:>9} {'ms mean':>8} {'ms p95':>8} {'RSS MB':>8} {'size MB':>8}")
+        for key, r in m["variants"].items():
+            if "error" in r:
+                print(f"{name:8} {key:20} error: {r['error']}")
+                continue
+            print(f"{name:8} {key:20} {_fmt(r.get(acc[0]), '8.3f')} {_fmt(r.get(acc[1]), '9.3f')} "
+                  f"{_fmt(r.get('latency_ms_mean'), '8.1f')} {_fmt(r.get('latency_ms_p95'), '8.1f')} "
+                  f"{_fmt(r.get('rss_mb'), '8.1f')} {_fmt(r.get('size_mb'), '8.1f')}")
+        if base.get("latency_ms_mean"):
+            best = min((r for r in m["variants"].values() if r.get("latency_ms_mean")),
+                       key=lambda r: r["latency_ms_mean"])
+            print(f"{'':8} fastest: {best['path']} ({base['latency_ms_mean'] / best['latency_ms_mean']:.2f}x vs torch)")
+    print("\nReport saved:", REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# run from anywhere: the backend imports itself as the top-level `app` package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
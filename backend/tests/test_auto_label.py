@@ -0,0 +1,36 @@
+import threading
+
+import cv2
+import numpy as np
+
+from app.services import auto_label, blob_store
+
+
+def _image(path):
+    img = np.zeros((120, 160, 3), np.uint8)
+    cv2.rectangle(img, (40, 30), (120, 90), (255, 255, 255), -1)
+    cv2.imwrite(str(path), img)
+    return str(path)
+
+
+def test_results_are_yielded_while_waiting_for_input(monkeypatch, tmp_path):
+    monkeypatch.setattr(auto_label, "GEOMETRY_CACHE_DB", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(blob_store, "INDEX_DB", str(tmp_path / "blobs.db"))
+    first, second = _image(tmp_path / "a.jpg"), _image(tmp_path / "b.jpg")
+    got_first = threading.Event()
+    waited = {}
+
+    def upload():
+        # the next path only arrives after the first result was handed back
+        yield first
+        waited["ok"] = got_first.wait(30)
+        yield second
+
+    out = []
+    for path, res in auto_label.contour_auto_label_many(upload(), workers=2):
+        out.append((path, res[0]))
+        got_first.set()
+
+    assert waited["ok"]
+    assert [p for p, _ in out] == [first, second]
+    assert all(ok for _, ok in out)
@@ -0,0 +1,74 @@
+import os
+import time
+
+import pytest
+
+from app.services import blob_store
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    blobs = tmp_path / "blobs"
+    monkeypatch.setattr(blob_store, "BLOB_DIR", str(blobs))
+    monkeypatch.setattr(blob_store, "INDEX_DB", str(blobs / "index.db"))
+    return tmp_path
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_place_links_duplicates_and_renames(store):
+    folder = str(store / "images")
+    a = blob_store.ingest_bytes(b"image-a", ".jpg")
+    b = blob_store.ingest_bytes(b"image-b", ".jpg")
+
+    assert blob_store.place(a, folder, "x.jpg") == ("x.jpg", "linked")
+    # same content under another name → the folder keeps its one copy
+    assert blob_store.place(a, folder, "y.jpg") == ("x.jpg", "duplicate")
+    assert not os.path.exists(os.path.join(folder, "y.jpg"))
+    # name held by other content → suffixed with the hash
+    final, status = blob_store.place(b, folder, "x.jpg")
+    assert (final, status) == (f"x_{b[:8]}.jpg", "renamed")
+
+    with open(os.path.join(folder, "x.jpg"), "rb") as f:
+        assert f.read() == b"image-a"
+    assert os.path.samefile(os.path.join(folder, "x.jpg"), blob_store.blob_path(a, ".jpg"))
+    assert blob_store.lookup(folder, final) == b
+    assert blob_store.stats() == {"blobs": 2, "bytes": 14, "names": 2}
+
+
+def test_move_ingests_a_legacy_file(store):
+    src, dst = str(store / "cache"), str(store / "final")
+    _write(store / "cache" / "old.png", b"legacy")      # never went through the store
+    assert blob_store.lookup(src, "old.png") is None
+
+    assert blob_store.move(src, "old.png", dst) == "old.png"
+    assert not os.path.exists(os.path.join(src, "old.png"))
+    with open(os.path.join(dst, "old.png"), "rb") as f:
+        assert f.read() == b"legacy"
+    assert blob_store.lookup(dst, "old.png") == blob_store.hash_bytes(b"legacy")
+    assert blob_store.lookup(src, "old.png") is None
+
+
+def test_gc_keeps_fresh_and_linked_blobs(store):
+    folder = str(store / "images")
+    linked = blob_store.ingest_bytes(b"linked", ".jpg")
+    blob_store.place(linked, folder, "keep.jpg")
+    orphan = blob_store.ingest_bytes(b"orphan", ".jpg")
+    fresh = blob_store.ingest_bytes(b"fresh", ".jpg")
+    with blob_store._db() as db:    # age everything but `fresh` past the grace window
+        db.execute("UPDATE blobs SET created=? WHERE hash!=?", (time.time() - 3600, fresh))
+
+    assert blob_store.gc(grace_s=60) == 1
+    assert not os.path.exists(blob_store.blob_path(orphan, ".jpg"))
+    assert os.path.exists(blob_store.blob_path(fresh, ".jpg"))
+    assert os.path.exists(blob_store.blob_path(linked, ".jpg"))
+
+    # once the folder entry is gone the linked blob is an orphan too
+    os.remove(os.path.join(folder, "keep.jpg"))
+    blob_store.forget_dir(folder)
+    assert blob_store.gc(grace_s=60) == 1
+    assert blob_store.stats()["blobs"] == 1
@@ -0,0 +1,83 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import label_status
+from app.services import label_index as label_index_module
+from app.services.label_index import LabelIndex
+
+
+@pytest.fixture
+def labels(monkeypatch, tmp_path):
+    monkeypatch.setattr(label_index_module, "CHANGELOG_MAX", 3)
+    folder = tmp_path / "labels"
+    folder.mkdir()
+    (folder / "a.txt").write_text("0 0.5 0.5 0.1 0.1\n")
+    index = LabelIndex([str(folder)])
+    monkeypatch.setattr(label_status, "label_index", index)
+    return folder, index
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(label_status.router, prefix="/api")
+    return TestClient(app)
+
+
+def _write(index, path):
+    path.write_text("0 0.5 0.5 0.1 0.1\n")
+    index.notify(str(path))
+
+
+def _remove(index, path):
+    os.remove(path)
+    index.notify(str(path))
+
+
+def test_matching_etag_is_not_modified(labels, client):
+    folder, index = labels
+    first = client.get("/api/labels/status")
+    assert first.json() == {"a": True}
+    etag = first.headers["etag"]
+
+    again = client.get("/api/labels/status", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+
+    _write(index, folder / "b.txt")
+    changed = client.get("/api/labels/status", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.json() == {"a": True, "b": True}
+    assert changed.headers["etag"] != etag
+
+
+def test_since_returns_only_newer_changes(labels, client):
+    folder, index = labels
+    v0 = int(client.get("/api/labels/status").headers["x-label-version"])
+    _write(index, folder / "b.txt")
+    v1 = index.snapshot()[0]
+    _write(index, folder / "c.txt")
+    _remove(index, folder / "a.txt")
+
+    body = client.get("/api/labels/status", params={"since": v1}).json()
+    assert body == {"version": v1 + 2, "full": False, "added": ["c"], "removed": ["a"]}
+    body = client.get("/api/labels/status", params={"since": v0}).json()
+    assert (body["added"], body["removed"]) == (["b", "c"], ["a"])
+    body = client.get("/api/labels/status", params={"since": v1 + 2}).json()
+    assert (body["full"], body["added"], body["removed"]) == (False, [], [])
+
+
+def test_since_older_than_changelog_resyncs_in_full(labels, client):
+    folder, index = labels
+    v0 = int(client.get("/api/labels/status").headers["x-label-version"])
+    for stem in "bcde":                     # 4 changes, changelog keeps 3
+        _write(index, folder / f"{stem}.txt")
+
+    body = client.get("/api/labels/status", params={"since": v0}).json()
+    assert body["full"] is True
+    assert body["version"] == v0 + 4
+    assert body["labels"] == {s: True for s in "abcde"}
+    # still inside the changelog → delta
+    assert client.get("/api/labels/status", params={"since": v0 + 1}).json()["full"] is False
@@ -0,0 +1,46 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import manual_label
+
+
+@pytest.fixture
+def dirs(monkeypatch, tmp_path):
+    images, labels = tmp_path / "images", tmp_path / "labels"
+    images.mkdir()
+    labels.mkdir()
+    for name in ("a.jpg", "b.jpg", "c.jpg"):
+        (images / name).write_bytes(b"jpg")
+    (labels / "a.txt").write_text("0 0.100000 0.100000 0.050000 0.050000\n")
+    monkeypatch.setattr(manual_label, "FINAL_IMG_DIR", str(images))
+    monkeypatch.setattr(manual_label, "FINAL_LABEL_DIR", str(labels))
+    return labels
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(manual_label.router, prefix="/api")
+    return TestClient(app)
+
+
+def _item(image, *boxes):
+    return {"image": image, "img_w": 100, "img_h": 100,
+            "boxes": [dict(zip(("x1", "y1", "x2", "y2"), b)) for b in boxes]}
+
+
+def test_one_bad_item_rejects_the_whole_batch(dirs, client):
+    before = {p.name: p.read_text() for p in dirs.iterdir()}
+    batch = {"items": [
+        _item("a.jpg", (10, 10, 50, 50)),          # would replace an existing label
+        _item("b.jpg", (0, 0, 20, 30), (40, 40, 90, 90)),
+        _item("c.jpg", (10, 10, 150, 50)),         # box outside the image
+    ]}
+
+    resp = client.post("/api/label/manual/batch", json=batch)
+
+    assert resp.status_code == 422
+    assert resp.json()["detail"] == [{"index": 2, "image": "c.jpg",
+                                      "errors": ["box 0: outside the image"]}]
+    assert {p.name: p.read_text() for p in dirs.iterdir()} == before
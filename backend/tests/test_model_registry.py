@@ -0,0 +1,147 @@
+import threading
+import time
+
+import numpy as np
+
+from app.services import detect, model_backends
+from app.services.model_registry import ModelRegistry
+
+
+class _Tensor:
+    def __init__(self, array):
+        self.array = array
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.array
+
+
+class _Boxes:
+    def __init__(self, data):
+        self.data = _Tensor(data)
+
+    def __len__(self):
+        return len(self.data.array)
+
+
+class _Result:
+    def __init__(self, data):
+        self.boxes = _Boxes(data)
+
+
+class SharedPredictorModel:
+    """
+    Mimics ultralytics: predict() stores its settings on the model and reads
+    them back later, so two overlapping calls on ONE instance mix them up.
+    Each result has one box whose confidence is the threshold it ran with.
+    """
+    names = {0: "object"}
+
+    def predict(self, tensor, conf=0.25, iou=0.45, verbose=False):
+        self.conf = conf
+        time.sleep(0.05)
+        box = np.array([[10, 10, 20, 20, self.conf, 0]], dtype=np.float32)
+        return [_Result(box) for _ in range(len(tensor))]
+
+
+def _registry(monkeypatch):
+    reg = ModelRegistry()
+    monkeypatch.setattr(reg, "_open_model", lambda artifact: SharedPredictorModel())
+    reg.register("custom", "fake-custom.pt", download=True)
+    reg.register("default", "fake-default.pt", download=True)
+    monkeypatch.setattr(detect, "registry", reg)
+    return reg
+
+
+def test_concurrent_calls_keep_their_own_conf(monkeypatch):
+    _registry(monkeypatch)
+    img = np.zeros((32, 32, 3), dtype=np.uint8)
+    seen = {}
+
+    def call(conf):
+        per_image, _, _ = detect.run_models([img], conf_thresh=conf, imgsz=32)
+        seen[conf] = {round(float(c), 2) for c in per_image[0]["conf"]}
+
+    threads = [threading.Thread(target=call, args=(c,)) for c in (0.1, 0.9)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert seen == {0.1: {0.1}, 0.9: {0.9}}
+
+
+def test_instances_are_reused_when_idle(monkeypatch):
+    reg = _registry(monkeypatch)
+    entry = reg.get("custom")
+    with reg.instance(entry) as first:
+        pass
+    with reg.instance(entry) as again:
+        assert again is first
+    with reg.instance(entry) as a, reg.instance(entry) as b:
+        assert a is not b
+    assert len(entry["free"]) == 2
+
+
+def test_ready_requires_required_models(monkeypatch, tmp_path):
+    reg = ModelRegistry()
+    monkeypatch.setattr(reg, "_open_model", lambda artifact: SharedPredictorModel())
+    reg.register("default", "fake-default.pt", download=True)
+    reg.register("custom", str(tmp_path / "absent.pt"), required=False)
+    assert reg.ready()                      # lazily unloaded counts as ready
+
+    assert reg.get("custom") is None        # optional model missing: still ready
+    assert reg.ready()
+
+    def broken(artifact):
+        raise RuntimeError("corrupt weights")
+
+    monkeypatch.setattr(reg, "_open_model", broken)
+    assert reg.get("default") is None
+    assert not reg.ready()                  # required model failed
+
+
+def test_exports_only_during_warmup(monkeypatch, tmp_path):
+    weights = tmp_path / "v1.pt"
+    weights.write_bytes(b"pt")
+    exported = []
+
+    def fake_export(path, backend, imgsz=640):
+        exported.append(path)
+        out = model_backends.exported_path(path, backend)
+        open(out, "wb").close()
+        return out
+
+    monkeypatch.setattr(model_backends, "runtime_available", lambda backend: True)
+    monkeypatch.setattr(model_backends, "export", fake_export)
+
+    reg = ModelRegistry()
+    monkeypatch.setattr(reg, "_open_model", lambda artifact: SharedPredictorModel())
+    reg.register("request", str(weights), backend="onnx")
+    entry = reg.get("request")                  # request-time load: no export
+    assert (entry["backend"], exported) == ("torch", [])
+    assert reg.swap("request", str(weights), warm=False)
+    assert exported == []
+
+    reg.register("warm", str(weights), backend="onnx")
+    assert reg.warmup("warm", imgsz=32)
+    assert exported == [str(weights)]
+    assert reg.get("warm")["backend"] == "onnx"
+
+
+def test_follow_pointer_is_read_without_the_registry_lock(monkeypatch):
+    reg = ModelRegistry()
+    monkeypatch.setattr(reg, "_open_model", lambda artifact: SharedPredictorModel())
+    held = []
+
+    def follow():
+        held.append(reg._lock.locked())
+        return None
+
+    reg.register("custom", "fake-custom.pt", download=True, follow=follow)
+    reg.get("custom")
+    monkeypatch.setattr(reg, "_follow_checked", {})     # due again
+    reg.get("custom")
+    assert held and not any(held)
@@ -0,0 +1,93 @@
+import os
+import random
+import statistics
+import time
+
+import pytest
+
+from app.services.dataset_index import DatasetIndex
+from app.services.reference_area import P2Quantile, ReferenceArea
+
+
+@pytest.mark.parametrize("dist", ["uniform", "lognormal", "bimodal"])
+def test_p2_tracks_the_median(dist):
+    rng = random.Random(7)
+    draw = {
+        "uniform": lambda: rng.uniform(0.001, 0.3),
+        "lognormal": lambda: rng.lognormvariate(-3, 0.8),
+        "bimodal": lambda: rng.choice((rng.gauss(0.02, 0.005), rng.gauss(0.08, 0.01))),
+    }[dist]
+    values = [abs(draw()) for _ in range(20000)]
+    est = P2Quantile()
+    for v in values:
+        est.add(v)
+    # P² guarantees rank accuracy; between two modes the density is low, so
+    # a small rank error is a large value error → compare values only when unimodal
+    rank = sum(v < est.value() for v in values) / len(values)
+    assert rank == pytest.approx(0.5, abs=0.02)
+    if dist != "bimodal":
+        assert est.value() == pytest.approx(statistics.median(values), rel=0.03)
+
+
+def test_p2_is_exact_for_few_values():
+    est = P2Quantile()
+    for v in (0.4, 0.1, 0.3, 0.2):
+        est.add(v)
+        assert est.value() == pytest.approx(statistics.median(est.q))
+
+
+@pytest.mark.parametrize("n", [1, 4, 5, 6, 101, 1000])
+def test_from_sorted_starts_at_exact_median(n):
+    values = sorted(random.Random(n).random() for _ in range(n))
+    est = P2Quantile.from_sorted(values)
+    assert est.value() == pytest.approx(statistics.median(values))
+    # and keeps working as an estimator afterwards
+    for v in values:
+        est.add(v)
+    assert est.value() == pytest.approx(statistics.median(values + values), rel=0.05)
+
+
+def test_p2_state_roundtrip():
+    est = P2Quantile()
+    for v in range(100):
+        est.add(v)
+    again = P2Quantile.from_dict(est.to_dict())
+    for v in range(100, 150):
+        est.add(v)
+        again.add(v)
+    assert again.value() == est.value()
+
+
+def _wait_idle(ref, timeout=5):
+    deadline = time.monotonic() + timeout
+    while ref._rebuilding and time.monotonic() < deadline:
+        time.sleep(0.02)
+
+
+def test_overwritten_label_is_not_counted_twice(tmp_path):
+    labels = tmp_path / "labels"
+    labels.mkdir()
+    index = DatasetIndex(str(tmp_path / "images"), str(labels), str(tmp_path / "dataset.db"))
+    ref = ReferenceArea(str(tmp_path / "reference_area.json"), str(labels), index=index)
+    for i, side in enumerate((0.1, 0.2, 0.3, 0.4, 0.5)):
+        (labels / f"i{i}.txt").write_text(f"0 0.5 0.5 {side} {side}\n")
+    assert ref.rebuild() == pytest.approx(0.09)      # exact median of 0.01..0.25
+
+    # the same label edited many times: its old boxes must leave the estimate
+    path = str(labels / "i4.txt")
+    for _ in range(10):
+        with open(path, "w") as f:
+            f.write("0 0.5 0.5 0.9 0.9\n")
+        ref.observe_label(path, "0 0.5 0.5 0.9 0.9\n", replaced=True)
+        _wait_idle(ref)
+    _wait_idle(ref)
+    assert ref._est.count == 5
+    assert ref.value() == pytest.approx(0.09)
+
+    # a new label is observed online
+    new = str(labels / "n.txt")
+    with open(new, "w") as f:
+        f.write("0 0.5 0.5 0.95 0.95\n")
+    ref.observe_label(new, "0 0.5 0.5 0.95 0.95\n")
+    assert ref._est.count == 6
+    assert os.path.exists(tmp_path / "reference_area.json")
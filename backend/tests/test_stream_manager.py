@@ -0,0 +1,82 @@
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from app.services.stream_manager import StreamManager
+
+
+@pytest.fixture
+def mjpeg_file(tmp_path):
+    """A short local MJPEG video standing in for an IP camera."""
+    path = str(tmp_path / "cam.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (64, 48))
+    for i in range(250):
+        writer.write(np.full((48, 64, 3), i, np.uint8))
+    writer.release()
+    return path
+
+
+@pytest.fixture
+def manager():
+    m = StreamManager(idle_ttl=30)
+    yield m
+    m.stop_all()
+
+
+def test_latest_frame_from_stream(manager, mjpeg_file):
+    frame, error = manager.latest_frame(mjpeg_file, wait=5)
+    assert error is None
+    assert frame.shape == (48, 64, 3)
+
+
+def test_latest_frame_unreachable(manager, tmp_path):
+    t0 = time.monotonic()
+    frame, error = manager.latest_frame(str(tmp_path / "missing.avi"), wait=5)
+    assert frame is None
+    assert error == "cannot_open_stream"
+    assert time.monotonic() - t0 < 5       # the failed open wakes the waiter early
+
+
+def test_wait_frame_returns_newer_frames(manager, mjpeg_file):
+    reader = manager.get(mjpeg_file)
+    _, first_id, _ = reader.wait_frame(0, timeout=5)
+    _, next_id, _ = reader.wait_frame(first_id, timeout=5)
+    assert next_id > first_id > 0
+
+
+def test_idle_reader_is_reaped(mjpeg_file):
+    manager = StreamManager(idle_ttl=0.5)
+    reader = manager.get(mjpeg_file)
+    reader.latest(wait=5)
+    deadline = time.monotonic() + 5
+    while manager.info() and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert manager.info() == []
+    assert reader.stopped
+    # a later request starts a fresh reader
+    assert manager.get(mjpeg_file) is not reader
+    manager.stop_all()
+
+
+def test_held_reader_survives_idle_ttl_and_other_release(mjpeg_file):
+    manager = StreamManager(idle_ttl=0.5)
+    reader = manager.acquire(mjpeg_file)        # e.g. a hub camera
+    manager.acquire(mjpeg_file)                 # e.g. a live viewer on the same URL
+    manager.release(mjpeg_file)                 # the viewer leaves
+    time.sleep(2.0)                             # > idle TTL + one janitor pass
+    assert not reader.stopped
+    assert manager.peek(mjpeg_file) is reader
+
+    manager.release(mjpeg_file)                 # last holder gone → reapable
+    deadline = time.monotonic() + 5
+    while manager.peek(mjpeg_file) and time.monotonic() < deadline:
+        time.sleep(0.1)
+    assert reader.stopped
+    manager.stop_all()
+
+
+def test_peek_does_not_start_a_reader(manager, mjpeg_file):
+    assert manager.peek(mjpeg_file) is None
+    assert manager.info() == []
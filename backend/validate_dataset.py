@@ -1,18 +1,25 @@
-import os
+from app.services.dataset_index import dataset_index
 
-IMG_DIR = "data/user_object/images/"
-LABEL_DIR = "data/user_object/labels/"
+# Incremental: only files changed since the last run are re-read
+dataset_index.refresh()
+report = dataset_index.validate(limit=50)
 
-images = {f.split('.')[0] for f in os.listdir(IMG_DIR)}
-labels = {f.split('.')[0] for f in os.listdir(LABEL_DIR)}
+titles = {
+    "missing_labels": "Missing labels for:",
+    "extra_labels": "Labels without images:",
+    "malformed": "Malformed labels:",
+    "out_of_range": "Boxes outside the image:",
+    "unreadable_images": "Unreadable images:",
+}
 
-missing = images - labels
-extra = labels - images
+for key, title in titles.items():
+    total = report["counts"][key]
+    if total:
+        hidden = total - len(report[key])
+        if hidden:
+            print(title, report[key], f"(+{hidden} more)")
+        else:
+            print(title, report[key])
 
-if missing:
-    print("Missing labels for:", missing)
-if extra:
-    print("Labels without images:", extra)
-
-if not missing and not extra:
+if report["ok"]:
     print("Dataset looks good!")
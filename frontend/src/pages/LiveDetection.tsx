@@ -1,5 +1,4 @@
 import { useState, useEffect, useRef } from "react";
-import axios from "axios";
 import type { DetectResult } from "../types/detect";
 
 export default function LiveDetection() {
@@ -12,18 +11,21 @@ export default function LiveDetection() {
   useEffect(() => {
     if (!cameraUrl) return;
 
-    const interval = setInterval(async () => {
+    // One shared server-side detection loop pushes results (SSE)
+    const source = new EventSource(
+      `/api/detect/stream/events?url=${encodeURIComponent(cameraUrl)}`
+    );
+
+    source.onmessage = (e) => {
       try {
-        const res = await axios.get("/api/detect/stream", {
-          params: { url: cameraUrl },
-        });
-        setResult(res.data.result);
+        setResult(JSON.parse(e.data).result);
       } catch {
         setResult({ error: "stream_error" });
       }
-    }, 600);
+    };
+    source.onerror = () => setResult({ error: "stream_error" });
 
-    return () => clearInterval(interval);
+    return () => source.close();
   }, [cameraUrl]);
 
   useEffect(() => {